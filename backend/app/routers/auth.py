@@ -1,15 +1,25 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from app.models.schemas import UserCreate, UserLogin, User, Token
-from app.models.database import users_collection
+from app.models.database import database, users_collection
 from app.services.auth import get_password_hash, verify_password, create_access_token, get_current_user
 from app.services.email_service import send_password_reset_email, send_password_changed_confirmation
 from datetime import timedelta, datetime
 from bson import ObjectId
+import hashlib
 import secrets
 from pydantic import BaseModel, EmailStr
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
 
+# Outstanding reset tokens (hashed); MongoDB removes them once expired via a TTL index
+reset_tokens_collection = database.get_collection("password_reset_tokens")
+
+RESET_TOKEN_LIFETIME = timedelta(hours=1)
+
+def _hash_reset_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
 # Additional request models for password reset
 class ForgotPasswordRequest(BaseModel):
     email: EmailStr
@@ -38,7 +48,14 @@ async def register(user_data: UserCreate):
         "created_at": datetime.utcnow()
     }
     
-    result = await users_collection.insert_one(user_dict)
+    try:
+        result = await users_collection.insert_one(user_dict)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration for the same email
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     user_dict["id"] = str(result.inserted_id)
     
     # Create access token
@@ -114,19 +131,13 @@ async def forgot_password(request: ForgotPasswordRequest):
         # Generate secure reset token (32 bytes = 64 hex characters)
         reset_token = secrets.token_urlsafe(32)
         
-        # Set token expiry (1 hour from now)
-        expiry = datetime.utcnow() + timedelta(hours=1)
-        
-        # Store token in database
-        await users_collection.update_one(
-            {"_id": user["_id"]},
-            {
-                "$set": {
-                    "reset_token": reset_token,
-                    "reset_token_expiry": expiry
-                }
-            }
-        )
+        # Store only its hash, replacing any earlier token for this user
+        await reset_tokens_collection.delete_many({"user_id": user["_id"]})
+        await reset_tokens_collection.insert_one({
+            "token_hash": _hash_reset_token(reset_token),
+            "user_id": user["_id"],
+            "expires_at": datetime.utcnow() + RESET_TOKEN_LIFETIME
+        })
         
         # Send email
         await send_password_reset_email(user["email"], reset_token)
@@ -141,11 +152,12 @@ async def reset_password(request: ResetPasswordRequest):
     """
     Reset password using token from email
     """
-    # Find user with valid token
-    user = await users_collection.find_one({
-        "reset_token": request.token,
-        "reset_token_expiry": {"$gt": datetime.utcnow()}
+    # Find a valid token (the TTL monitor runs only once a minute, so check expiry too)
+    reset_token = await reset_tokens_collection.find_one({
+        "token_hash": _hash_reset_token(request.token),
+        "expires_at": {"$gt": datetime.utcnow()}
     })
+    user = await users_collection.find_one({"_id": reset_token["user_id"]}) if reset_token else None
     
     if not user:
         raise HTTPException(
@@ -156,7 +168,7 @@ async def reset_password(request: ResetPasswordRequest):
     # Hash new password
     hashed_password = get_password_hash(request.new_password)
     
-    # Update password and remove reset token
+    # Update password and remove reset tokens (including any stored on the user by older versions)
     await users_collection.update_one(
         {"_id": user["_id"]},
         {
@@ -169,6 +181,7 @@ async def reset_password(request: ResetPasswordRequest):
             }
         }
     )
+    await reset_tokens_collection.delete_many({"user_id": user["_id"]})
     
     # Send confirmation email
     await send_password_changed_confirmation(user["email"], user["name"])
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, HTTPException, status, UploadFile, File, Depends, Query
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Depends, Query, Request
 from typing import List, Optional
 from app.models.schemas import Document
 from app.models.database import documents_collection
 from app.services.auth import get_current_user, verify_token
-from nlp_modules.text_extractor import extract_text_from_file
-from nlp_modules.converter import convert_to_pdf
+from app.services.blob_store import blob_store
+from app.services.folder_counts import folder_counter
+from app.services.ingestion import ingestion_queue, jobs_collection, job_to_response, IngestionJob
+from app.services.text_store import text_store, load_document_text
+from app.services.document_listing import (
+    DocumentSummary, list_documents, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+)
+from app.services.render_cache import render_cache
+from app.services.file_responses import serve_file
+from app.services.json_responses import trusted_response
+from nlp_modules.page_renderer import RENDER_SIZES, PageNotFound
+from nlp_modules.process_pool import ExtractionQueueFull
+from pydantic import BaseModel
 from datetime import datetime
 from bson import ObjectId
-import aiofiles
 import os
 from dotenv import load_dotenv
 
@@ -16,16 +25,50 @@ load_dotenv()
 
 router = APIRouter()
 
-UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
-MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10485760))
+MAX_TEXT_PAGES_PER_REQUEST = 100
+PAGE_IMAGE_MAX_AGE = 31536000  # One year
 
-@router.post("/upload", response_model=Document, status_code=status.HTTP_201_CREATED)
+class PageText(BaseModel):
+    page: int
+    text: str
+    start: int
+    end: int
+
+class DocumentText(BaseModel):
+    document_id: str
+    page_count: int
+    text_length: int
+    pages: List[PageText]
+
+def _parse_page_range(pages: str, page_count: int) -> tuple:
+    """Parse '10-20', '7' or '30-' into an inclusive (first, last) page range"""
+    try:
+        if "-" in pages:
+            first, last = pages.split("-", 1)
+            first = int(first) if first.strip() else 1
+            last = int(last) if last.strip() else page_count
+        else:
+            first = last = int(pages)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid page range, expected e.g. 10-20"
+        )
+    
+    if first < 1 or last < first:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid page range"
+        )
+    return first, min(last, first + MAX_TEXT_PAGES_PER_REQUEST - 1)
+
+@router.post("/upload", response_model=IngestionJob, status_code=status.HTTP_202_ACCEPTED)
 async def upload_document(
     file: UploadFile = File(...),
     folder_id: Optional[str] = None,
     user_id: str = Depends(get_current_user)
 ):
-    """Upload a document and extract text"""
+    """Store an uploaded document and queue it for text extraction"""
     # Validate file type
     allowed_types = [
         "application/pdf",
@@ -39,66 +82,77 @@ async def upload_document(
             detail="File type not supported"
         )
     
-    # Save file
-    file_extension = file.filename.split(".")[-1]
-    file_path = os.path.join(UPLOAD_DIR, f"{user_id}_{datetime.utcnow().timestamp()}.{file_extension}")
-    
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    # Save file (identical content is stored only once)
+    file_extension = file.filename.split(".")[-1].lower()
+    blob = await blob_store.put(file, file_extension)
     
-    # Convert DOCX/PPTX to PDF for preview (Windows only for DOCX)
-    pdf_path = None
-    if file_extension in ["docx", "pptx"]:
-        pdf_path = file_path.replace(f".{file_extension}", "_preview.pdf")
-        success = convert_to_pdf(file_path, pdf_path)
-        if not success:
-            pdf_path = None  # Conversion failed, will use original file
-    
-    # Extract text from file
-    try:
-        extracted_text = await extract_text_from_file(file_path, file_extension)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Text extraction failed: {str(e)}"
-        )
-    
-    # Save document metadata to database
+    # Save document metadata; text is filled in by the ingestion worker
     document_dict = {
         "user_id": user_id,
         "filename": file.filename,
         "file_type": file_extension,
-        "file_path": file_path,
-        "pdf_path": pdf_path,
-        "processed_text": extracted_text,
+        "file_path": blob["path"],
+        "file_size": blob["size"],
+        "content_hash": blob["_id"],
+        "pdf_path": None,
+        "processed_text": None,
+        "status": "processing",
         "uploaded_at": datetime.utcnow()
     }
     
     if folder_id:
         document_dict["folder_id"] = folder_id
     
-    result = await documents_collection.insert_one(document_dict)
-    document_dict["id"] = str(result.inserted_id)
-    
-    return Document(
-        id=document_dict["id"],
-        user_id=document_dict["user_id"],
-        filename=document_dict["filename"],
-        file_type=document_dict["file_type"],
-        folder_id=document_dict.get("folder_id"),
-        uploaded_at=document_dict["uploaded_at"],
-        processed_text=document_dict["processed_text"]
-    )
+    try:
+        result = await documents_collection.insert_one(document_dict)
+        job = await ingestion_queue.enqueue(str(result.inserted_id), user_id, blob["path"], file_extension)
+    except Exception:
+        # Undo the upload, or the reference taken by blob_store.put would never be released
+        if "_id" in document_dict:
+            await documents_collection.delete_one({"_id": document_dict["_id"]})
+        await blob_store.release(blob["_id"])
+        raise
+    await folder_counter.adjust(folder_id, 1)
+    
+    return job_to_response(job)
 
-@router.get("/", response_model=List[Document])
+@router.get("/jobs/{job_id}", response_model=IngestionJob)
+async def get_ingestion_job(job_id: str, user_id: str = Depends(get_current_user)):
+    """Get the processing stage of an uploaded document"""
+    job = await jobs_collection.find_one({
+        "_id": ObjectId(job_id),
+        "user_id": user_id
+    })
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return job_to_response(job)
+
+@router.post("/jobs/{job_id}/retry", response_model=IngestionJob, status_code=status.HTTP_202_ACCEPTED)
+async def retry_ingestion_job(job_id: str, user_id: str = Depends(get_current_user)):
+    """Queue a failed ingestion job again"""
+    job = await ingestion_queue.retry(job_id, user_id)
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Failed job not found"
+        )
+    
+    return job_to_response(job)
+
+@router.get("/", response_model=List[DocumentSummary])
 async def get_all_documents(
     folder_id: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     user_id: str = Depends(get_current_user)
 ):
-    """Get all documents for current user, optionally filtered by folder"""
+    """List documents for current user, newest first, optionally filtered by folder (metadata only)"""
     query = {"user_id": user_id}
     
     if folder_id:
@@ -107,21 +161,8 @@ async def get_all_documents(
         # Get documents not in any folder (root level)
         query["folder_id"] = {"$exists": False}
     
-    documents = []
-    cursor = documents_collection.find(query).sort("uploaded_at", -1)
-    
-    async for doc in cursor:
-        documents.append(Document(
-            id=str(doc["_id"]),
-            user_id=doc["user_id"],
-            filename=doc["filename"],
-            file_type=doc["file_type"],
-            folder_id=doc.get("folder_id"),
-            uploaded_at=doc["uploaded_at"],
-            processed_text=doc.get("processed_text")
-        ))
-    
-    return documents
+    documents, next_cursor = await list_documents(query, cursor, limit)
+    return trusted_response(documents, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
 
 @router.get("/{document_id}", response_model=Document)
 async def get_document(document_id: str, user_id: str = Depends(get_current_user)):
@@ -137,15 +178,58 @@ async def get_document(document_id: str, user_id: str = Depends(get_current_user
             detail="Document not found"
         )
     
-    return Document(
+    return trusted_response(Document.model_construct(
         id=str(document["_id"]),
         user_id=document["user_id"],
         filename=document["filename"],
         file_type=document["file_type"],
         folder_id=document.get("folder_id"),
         uploaded_at=document["uploaded_at"],
-        processed_text=document.get("processed_text")
+        processed_text=await load_document_text(document)
+    ))
+
+@router.get("/{document_id}/text", response_model=DocumentText)
+async def get_document_text(
+    document_id: str,
+    pages: Optional[str] = Query(None, description="Page range, e.g. 10-20"),
+    user_id: str = Depends(get_current_user)
+):
+    """Get extracted text page by page (slides for PPTX, sections for DOCX)"""
+    document = await documents_collection.find_one(
+        {"_id": ObjectId(document_id), "user_id": user_id},
+        {"content_hash": 1, "page_count": 1, "section_count": 1, "text_length": 1, "processed_text": 1, "status": 1}
     )
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    if document.get("status") == "processing":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document is still being processed"
+        )
+    
+    if document.get("page_count") is None:
+        # Uploaded before text was stored per page (inline, or migrated as sections without
+        # page boundaries): serve it as a single page
+        text = await load_document_text(document) or ""
+        page_list = [PageText.model_construct(page=1, text=text, start=0, end=len(text))] if text else []
+        return trusted_response(DocumentText.model_construct(
+            document_id=document_id, page_count=len(page_list), text_length=len(text), pages=page_list
+        ))
+    
+    first, last = _parse_page_range(pages, document["page_count"]) if pages else (1, MAX_TEXT_PAGES_PER_REQUEST)
+    page_list = await text_store.get_pages(document["content_hash"], first, last)
+    
+    return trusted_response(DocumentText.model_construct(
+        document_id=document_id,
+        page_count=document["page_count"],
+        text_length=document["text_length"],
+        pages=[PageText.model_construct(**page) for page in page_list]
+    ))
 
 @router.delete("/{document_id}")
 async def delete_document(document_id: str, user_id: str = Depends(get_current_user)):
@@ -161,22 +245,33 @@ async def delete_document(document_id: str, user_id: str = Depends(get_current_u
             detail="Document not found"
         )
     
-    # Delete file from filesystem
-    if os.path.exists(document["file_path"]):
-        os.remove(document["file_path"])
-    
-    # Delete PDF preview if exists
-    if document.get("pdf_path") and os.path.exists(document["pdf_path"]):
-        os.remove(document["pdf_path"])
-    
     # Delete from database
-    await documents_collection.delete_one({"_id": ObjectId(document_id)})
+    result = await documents_collection.delete_one({"_id": ObjectId(document_id)})
+    await folder_counter.adjust(document.get("folder_id"), -result.deleted_count)
+    await jobs_collection.delete_many({"document_id": document_id})
+    
+    # Shared content is only deleted with its last reference
+    content_hash = document.get("content_hash")
+    if not content_hash or not await blob_store.release(content_hash):
+        # Uploaded before deduplication: the document owns its files
+        if os.path.exists(document["file_path"]):
+            os.remove(document["file_path"])
+        
+        if document.get("pdf_path") and os.path.exists(document["pdf_path"]):
+            os.remove(document["pdf_path"])
+        
+        if not content_hash:
+            # Its page images are cached under the document id
+            await render_cache.delete(document_id)
+        elif not await documents_collection.count_documents({"content_hash": content_hash}, limit=1):
+            await text_store.delete(content_hash)
+            await render_cache.delete(content_hash)
     
     return {"message": "Document deleted successfully"}
 
 @router.get("/{document_id}/file")
-async def get_document_file(document_id: str, token: Optional[str] = Query(None)):
-    """Serve the actual document file - returns PDF preview for DOCX/PPTX"""
+async def get_document_file(request: Request, document_id: str, token: Optional[str] = Query(None)):
+    """Serve the actual document file - returns PDF preview for DOCX/PPTX (supports Range and conditional GET)"""
     # Verify token from query parameter
     user_id = None
     if token:
@@ -189,10 +284,10 @@ async def get_document_file(document_id: str, token: Optional[str] = Query(None)
         )
     
     try:
-        document = await documents_collection.find_one({
-            "_id": ObjectId(document_id),
-            "user_id": user_id
-        })
+        document = await documents_collection.find_one(
+            {"_id": ObjectId(document_id), "user_id": user_id},
+            {"filename": 1, "file_type": 1, "file_path": 1, "pdf_path": 1, "content_hash": 1, "uploaded_at": 1}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -205,12 +300,16 @@ async def get_document_file(document_id: str, token: Optional[str] = Query(None)
             detail="Document not found"
         )
     
+    # Stored content never changes for a document, so its hash is a strong validator
+    content_key = document.get("content_hash") or document_id
+    
     # For DOCX/PPTX, return PDF preview if available
     file_type = document.get("file_type", "pdf")
     if file_type in ["docx", "pptx"] and document.get("pdf_path"):
         file_path = document.get("pdf_path")
         media_type = "application/pdf"
         content_disposition_type = "inline"
+        etag = f'"{content_key}-pdf"'
     else:
         file_path = document.get("file_path")
         # Determine media type based on file extension
@@ -222,6 +321,7 @@ async def get_document_file(document_id: str, token: Optional[str] = Query(None)
         media_type = media_types.get(file_type, "application/octet-stream")
         # Use 'inline' for PDF to display in browser, 'attachment' for office docs
         content_disposition_type = "inline" if file_type == "pdf" else "attachment"
+        etag = f'"{content_key}"'
     
     if not file_path or not os.path.exists(file_path):
         raise HTTPException(
@@ -229,10 +329,92 @@ async def get_document_file(document_id: str, token: Optional[str] = Query(None)
             detail="Document file not found on server"
         )
     
-    return FileResponse(
-        path=file_path,
-        media_type=media_type,
+    return serve_file(
+        request,
+        file_path,
+        media_type,
+        etag=etag,
+        last_modified=document.get("uploaded_at"),
         headers={
             "Content-Disposition": f'{content_disposition_type}; filename="{document.get("filename", f"document.{file_type}")}"'
         }
     )
+
+@router.get("/{document_id}/pages/{page_number}/image")
+async def get_page_image(
+    request: Request,
+    document_id: str,
+    page_number: int,
+    size: str = Query("medium"),
+    token: Optional[str] = Query(None)
+):
+    """Serve one page of a document as a JPEG at a fixed size (thumb, medium or large)"""
+    # Token in the query string so the URL can be used directly in <img> tags
+    user_id = verify_token(token) if token else None
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+    
+    if size not in RENDER_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid size, expected one of: {', '.join(RENDER_SIZES)}"
+        )
+    
+    try:
+        document = await documents_collection.find_one(
+            {"_id": ObjectId(document_id), "user_id": user_id},
+            {"file_type": 1, "file_path": 1, "pdf_path": 1, "content_hash": 1}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid document ID: {str(e)}"
+        )
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    # PDFs render directly; DOCX/PPTX only once a PDF preview exists
+    source_path = document.get("file_path") if document.get("file_type") == "pdf" else document.get("pdf_path")
+    if not source_path or not os.path.exists(source_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Page previews are not available for this document"
+        )
+    
+    # Pages beyond the end are rejected by the renderer, against the file's own page count
+    if page_number < 1:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Page not found"
+        )
+    
+    cache_key = document.get("content_hash") or document_id
+    try:
+        image_path = await render_cache.get(cache_key, source_path, page_number, size)
+    except PageNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Page not found"
+        )
+    except ExtractionQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy rendering pages, try again shortly",
+            headers={"Retry-After": "2"}
+        )
+    
+    # The image for a (content, page, size) never changes, so browsers can keep it
+    return serve_file(
+        request,
+        image_path,
+        "image/jpeg",
+        etag=f'"{cache_key}-{page_number}-{size}"',
+        cache_control=f"private, max-age={PAGE_IMAGE_MAX_AGE}, immutable"
+    )
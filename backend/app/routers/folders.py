@@ -1,12 +1,19 @@
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
-from typing import List
-from app.models.schemas import Folder, FolderCreate, Document
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Query
+from typing import List, Optional
+from pydantic import BaseModel
+from app.models.schemas import Folder, FolderCreate
 from app.models.database import database, documents_collection
 from app.services.auth import get_current_user
-from nlp_modules.text_extractor import extract_text_from_file
+from app.services.blob_store import blob_store
+from app.services.folder_counts import folder_counter
+from app.services.document_listing import (
+    DocumentSummary, list_documents, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+)
+from app.services.ingestion import ingestion_queue, job_to_response, IngestionJob
+from app.services.json_responses import trusted_response
 from datetime import datetime
 from bson import ObjectId
-import aiofiles
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -16,7 +23,26 @@ router = APIRouter()
 
 folders_collection = database.get_collection("folders")
 
-UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", 50))
+BATCH_UPLOAD_CONCURRENCY = 4  # Files copied to storage at the same time
+
+ALLOWED_CONTENT_TYPES = [
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+]
+
+class BatchUploadItem(BaseModel):
+    filename: str
+    status: str  # "queued" or "rejected"
+    document_id: Optional[str] = None
+    job_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    queued: int
+    rejected: int
+    files: List[BatchUploadItem]
 
 @router.post("/", response_model=Folder, status_code=status.HTTP_201_CREATED)
 async def create_folder(
@@ -40,48 +66,42 @@ async def create_folder(
         "user_id": user_id,
         "name": folder.name,
         "color": folder.color or "#6B7280",
-        "created_at": datetime.utcnow()
+        "created_at": datetime.utcnow(),
+        **folder_counter.initial_fields()
     }
     
     result = await folders_collection.insert_one(folder_dict)
     folder_dict["id"] = str(result.inserted_id)
     
-    # Count documents in this folder
-    doc_count = await documents_collection.count_documents({
-        "folder_id": folder_dict["id"]
-    })
-    
+    # A new folder has no documents yet
     return Folder(
         id=folder_dict["id"],
         user_id=folder_dict["user_id"],
         name=folder_dict["name"],
         color=folder_dict["color"],
         created_at=folder_dict["created_at"],
-        document_count=doc_count
+        document_count=0
     )
 
 @router.get("/", response_model=List[Folder])
 async def get_all_folders(user_id: str = Depends(get_current_user)):
     """Get all folders for current user"""
-    folders = []
-    cursor = folders_collection.find({"user_id": user_id}).sort("created_at", -1)
-    
-    async for folder in cursor:
-        # Count documents in this folder
-        doc_count = await documents_collection.count_documents({
-            "folder_id": str(folder["_id"])
-        })
-        
-        folders.append(Folder(
+    folders = await folders_collection.find({"user_id": user_id}).sort("created_at", -1).to_list(None)
+    
+    # Document counts for all folders at once
+    counts = await folder_counter.counts(user_id, folders)
+    
+    return trusted_response([
+        Folder.model_construct(
             id=str(folder["_id"]),
             user_id=folder["user_id"],
             name=folder["name"],
             color=folder.get("color", "#6B7280"),
             created_at=folder["created_at"],
-            document_count=doc_count
-        ))
-    
-    return folders
+            document_count=counts[str(folder["_id"])]
+        )
+        for folder in folders
+    ])
 
 @router.get("/{folder_id}", response_model=Folder)
 async def get_folder(folder_id: str, user_id: str = Depends(get_current_user)):
@@ -97,10 +117,7 @@ async def get_folder(folder_id: str, user_id: str = Depends(get_current_user)):
             detail="Folder not found"
         )
     
-    # Count documents in this folder
-    doc_count = await documents_collection.count_documents({
-        "folder_id": folder_id
-    })
+    counts = await folder_counter.counts(user_id, [folder])
     
     return Folder(
         id=str(folder["_id"]),
@@ -108,12 +125,17 @@ async def get_folder(folder_id: str, user_id: str = Depends(get_current_user)):
         name=folder["name"],
         color=folder.get("color", "#6B7280"),
         created_at=folder["created_at"],
-        document_count=doc_count
+        document_count=counts[folder_id]
     )
 
-@router.get("/{folder_id}/documents", response_model=List[Document])
-async def get_folder_documents(folder_id: str, user_id: str = Depends(get_current_user)):
-    """Get all documents in a folder"""
+@router.get("/{folder_id}/documents", response_model=List[DocumentSummary])
+async def get_folder_documents(
+    folder_id: str,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user_id: str = Depends(get_current_user)
+):
+    """List documents in a folder, newest first (metadata only)"""
     # Verify folder exists and belongs to user
     folder = await folders_collection.find_one({
         "_id": ObjectId(folder_id),
@@ -126,32 +148,16 @@ async def get_folder_documents(folder_id: str, user_id: str = Depends(get_curren
             detail="Folder not found"
         )
     
-    documents = []
-    cursor = documents_collection.find({
-        "folder_id": folder_id,
-        "user_id": user_id
-    }).sort("uploaded_at", -1)
-    
-    async for doc in cursor:
-        documents.append(Document(
-            id=str(doc["_id"]),
-            user_id=doc["user_id"],
-            filename=doc["filename"],
-            file_type=doc["file_type"],
-            folder_id=doc.get("folder_id"),
-            uploaded_at=doc["uploaded_at"],
-            processed_text=doc.get("processed_text")
-        ))
-    
-    return documents
+    documents, next_cursor = await list_documents({"folder_id": folder_id, "user_id": user_id}, cursor, limit)
+    return trusted_response(documents, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
 
-@router.post("/{folder_id}/documents", response_model=Document, status_code=status.HTTP_201_CREATED)
+@router.post("/{folder_id}/documents", response_model=IngestionJob, status_code=status.HTTP_202_ACCEPTED)
 async def upload_document_to_folder(
     folder_id: str,
     file: UploadFile = File(...),
     user_id: str = Depends(get_current_user)
 ):
-    """Upload a document to a specific folder"""
+    """Store a document in a specific folder and queue it for text extraction"""
     # Verify folder exists and belongs to user
     folder = await folders_collection.find_one({
         "_id": ObjectId(folder_id),
@@ -165,59 +171,142 @@ async def upload_document_to_folder(
         )
     
     # Validate file type
-    allowed_types = [
-        "application/pdf",
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        "application/vnd.openxmlformats-officedocument.presentationml.presentation"
-    ]
-    
-    if file.content_type not in allowed_types:
+    if file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File type not supported"
         )
     
-    # Save file
-    file_extension = file.filename.split(".")[-1]
-    file_path = os.path.join(UPLOAD_DIR, f"{user_id}_{datetime.utcnow().timestamp()}.{file_extension}")
-    
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
-    
-    # Extract text from file
-    try:
-        extracted_text = await extract_text_from_file(file_path, file_extension)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Text extraction failed: {str(e)}"
-        )
+    # Save file (identical content is stored only once)
+    file_extension = file.filename.split(".")[-1].lower()
+    blob = await blob_store.put(file, file_extension)
     
-    # Save document metadata to database
+    # Save document metadata; text is filled in by the ingestion worker
     document_dict = {
         "user_id": user_id,
         "folder_id": folder_id,
         "filename": file.filename,
         "file_type": file_extension,
-        "file_path": file_path,
-        "processed_text": extracted_text,
+        "file_path": blob["path"],
+        "file_size": blob["size"],
+        "content_hash": blob["_id"],
+        "pdf_path": None,
+        "processed_text": None,
+        "status": "processing",
         "uploaded_at": datetime.utcnow()
     }
     
-    result = await documents_collection.insert_one(document_dict)
-    document_dict["id"] = str(result.inserted_id)
-    
-    return Document(
-        id=document_dict["id"],
-        user_id=document_dict["user_id"],
-        filename=document_dict["filename"],
-        file_type=document_dict["file_type"],
-        folder_id=document_dict["folder_id"],
-        uploaded_at=document_dict["uploaded_at"],
-        processed_text=document_dict["processed_text"]
+    try:
+        result = await documents_collection.insert_one(document_dict)
+        job = await ingestion_queue.enqueue(str(result.inserted_id), user_id, blob["path"], file_extension)
+    except Exception:
+        # Undo the upload, or the reference taken by blob_store.put would never be released
+        if "_id" in document_dict:
+            await documents_collection.delete_one({"_id": document_dict["_id"]})
+        await blob_store.release(blob["_id"])
+        raise
+    await folder_counter.adjust(folder_id, 1)
+    
+    return job_to_response(job)
+
+@router.post("/{folder_id}/documents/batch", response_model=BatchUploadResponse, status_code=status.HTTP_202_ACCEPTED)
+async def upload_documents_to_folder_batch(
+    folder_id: str,
+    files: List[UploadFile] = File(...),
+    user_id: str = Depends(get_current_user)
+):
+    """Store many documents in a folder in one request and queue them all for text extraction"""
+    folder = await folders_collection.find_one({
+        "_id": ObjectId(folder_id),
+        "user_id": user_id
+    })
+    
+    if not folder:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Folder not found"
+        )
+    
+    if len(files) > BATCH_UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many files (max {BATCH_UPLOAD_MAX_FILES} per batch)"
+        )
+    
+    semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+    
+    async def store(file: UploadFile) -> dict:
+        """Stream one file to storage; returns the blob or an error for this file only"""
+        if file.content_type not in ALLOWED_CONTENT_TYPES:
+            return {"error": "File type not supported"}
+        file_extension = file.filename.split(".")[-1].lower()
+        async with semaphore:
+            try:
+                return {"blob": await blob_store.put(file, file_extension), "file_type": file_extension}
+            except HTTPException as e:
+                return {"error": e.detail}
+            except Exception as e:
+                return {"error": f"Storing file failed: {str(e)}"}
+    
+    stored = await asyncio.gather(*(store(file) for file in files))
+    
+    # One insert for all documents and one for all their ingestion jobs
+    now = datetime.utcnow()
+    document_dicts = []
+    for file, outcome in zip(files, stored):
+        if "blob" in outcome:
+            blob = outcome["blob"]
+            document_dicts.append({
+                "user_id": user_id,
+                "folder_id": folder_id,
+                "filename": file.filename,
+                "file_type": outcome["file_type"],
+                "file_path": blob["path"],
+                "file_size": blob["size"],
+                "content_hash": blob["_id"],
+                "pdf_path": None,
+                "processed_text": None,
+                "status": "processing",
+                "uploaded_at": now
+            })
+    
+    jobs = []
+    if document_dicts:
+        try:
+            result = await documents_collection.insert_many(document_dicts)
+            jobs = await ingestion_queue.enqueue_many([
+                (str(inserted_id), user_id, document["file_path"], document["file_type"])
+                for inserted_id, document in zip(result.inserted_ids, document_dicts)
+            ])
+        except Exception:
+            # Undo the batch (insert_many may have stored some documents before failing),
+            # or the references taken by blob_store.put would never be released
+            inserted_ids = [document["_id"] for document in document_dicts if "_id" in document]
+            if inserted_ids:
+                await documents_collection.delete_many({"_id": {"$in": inserted_ids}})
+            for document in document_dicts:
+                await blob_store.release(document["content_hash"])
+            raise
+        await folder_counter.adjust(folder_id, len(document_dicts))
+    
+    items = []
+    queued_jobs = iter(jobs)
+    for file, outcome in zip(files, stored):
+        if "blob" in outcome:
+            job = next(queued_jobs)
+            items.append(BatchUploadItem(
+                filename=file.filename,
+                status="queued",
+                document_id=job["document_id"],
+                job_id=str(job["_id"])
+            ))
+        else:
+            items.append(BatchUploadItem(filename=file.filename, status="rejected", error=outcome["error"]))
+    
+    return BatchUploadResponse(
+        queued=len(jobs),
+        rejected=len(items) - len(jobs),
+        files=items
     )
 
 @router.put("/{folder_id}")
@@ -266,7 +355,7 @@ async def delete_folder(folder_id: str, user_id: str = Depends(get_current_user)
             detail="Folder not found"
         )
     
-    # Move all documents in this folder to root (remove folder_id)
+    # Move all documents in this folder to root (remove folder_id); its counter goes with it
     await documents_collection.update_many(
         {"folder_id": folder_id},
         {"$unset": {"folder_id": ""}}
@@ -1,30 +1,132 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from typing import List
 from app.models.schemas import SummaryRequest, Summary, ExplanationRequest, Explanation
 from app.models.database import documents_collection, summaries_collection, explanations_collection
 from app.services.auth import get_current_user
-from nlp_modules.summarizer import generate_summary
+from app.services.text_store import load_document_text
+from app.services.artifacts import artifact_store
+from app.services.json_responses import trusted_response
+from nlp_modules.summarizer import generate_summary, generate_extractive_summary_tfidf
 from nlp_modules.explainer import generate_explanation
-from nlp_modules.api_client import generate_key_points_with_api, generate_short_notes_with_api
+from nlp_modules.api_client import (
+    generate_study_notes_with_api,
+    stream_summary_with_api,
+    stream_explanation_with_api,
+    stream_key_points_with_api,
+    stream_short_notes_with_api,
+)
+from nlp_modules.llm_cache import llm_cache
+from nlp_modules.provider_router import provider_router
+from nlp_modules.scheduler import llm_scheduler
+from nlp_modules.single_flight import single_flight
 from datetime import datetime
 from bson import ObjectId
 from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import hashlib
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
 
 router = APIRouter()
 
+# "parallel": key points and short notes as two concurrent calls
+# "combined": one call returning both as structured JSON (half the input tokens)
+STUDY_NOTES_MODE = os.getenv("STUDY_NOTES_MODE", "parallel")
+
 class StudyNotesResponse(BaseModel):
     key_points: str
     short_notes: str
 
-@router.post("/summarize", response_model=Summary)
-async def summarize_document(
-    request: SummaryRequest,
-    user_id: str = Depends(get_current_user)
-):
-    """Generate a summary for a document"""
-    # Get document
+# Headers that keep proxies (nginx, Render) from buffering server-sent events
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+SUMMARY_HISTORY_PROJECTION = {"document_id": 1, "summary_text": 1, "summary_type": 1, "created_at": 1}
+
+def _sse_event(event: str, data) -> str:
+    """Format a single server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+def _text_hash(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+async def _save_summary(document_id: str, summary_text: str, summary_type: str) -> Summary:
+    """Persist a generated summary, reusing the existing record if the identical summary was already saved"""
+    # Upsert so double-clicks / duplicate tabs don't store the same summary twice
+    key = {
+        "document_id": document_id,
+        "summary_type": summary_type,
+        "text_hash": _text_hash(summary_text)
+    }
+    try:
+        summary = await summaries_collection.find_one_and_update(
+            key,
+            {
+                "$setOnInsert": {
+                    "summary_text": summary_text,
+                    "created_at": datetime.utcnow()
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent upsert (e.g. coalesced callers saving together) inserted it first
+        summary = await summaries_collection.find_one(key)
+    
+    return Summary(
+        id=str(summary["_id"]),
+        document_id=summary["document_id"],
+        summary_text=summary["summary_text"],
+        summary_type=summary["summary_type"],
+        created_at=summary["created_at"]
+    )
+
+async def _save_explanation(document_id: str, original_text: str, explained_text: str, tone: str) -> Explanation:
+    """Persist a generated explanation, reusing the existing record for an identical one"""
+    key = {
+        "document_id": document_id,
+        "tone": tone,
+        "text_hash": _text_hash(original_text, explained_text)
+    }
+    try:
+        explanation = await explanations_collection.find_one_and_update(
+            key,
+            {
+                "$setOnInsert": {
+                    "original_text": original_text,
+                    "explained_text": explained_text,
+                    "created_at": datetime.utcnow()
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent upsert inserted it first
+        explanation = await explanations_collection.find_one(key)
+    
+    return Explanation(
+        id=str(explanation["_id"]),
+        document_id=explanation["document_id"],
+        original_text=explanation["original_text"],
+        explained_text=explanation["explained_text"],
+        tone=explanation["tone"],
+        created_at=explanation["created_at"]
+    )
+
+async def _get_document_with_text(document_id: str, user_id: str) -> dict:
+    """Load a document owned by the user and make sure it has extracted text"""
     document = await documents_collection.find_one({
-        "_id": ObjectId(request.document_id),
+        "_id": ObjectId(document_id),
         "user_id": user_id
     })
     
@@ -34,36 +136,90 @@ async def summarize_document(
             detail="Document not found"
         )
     
-    if not document.get("processed_text"):
+    if document.get("status") == "processing":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document is still being processed"
+        )
+    
+    document["processed_text"] = await load_document_text(document)
+    if not document["processed_text"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Document text not available"
         )
     
+    return document
+
+@router.post("/summarize", response_model=Summary)
+async def summarize_document(
+    request: SummaryRequest,
+    user_id: str = Depends(get_current_user)
+):
+    """Generate a summary for a document"""
+    document = await _get_document_with_text(request.document_id, user_id)
+    
+    # Reuse a summary generated for an identical upload
+    cached = await artifact_store.get(document.get("content_hash"), "summary", request.type)
+    if cached:
+        return await _save_summary(request.document_id, cached["summary_text"], request.type)
+    
     # Generate summary
     try:
         summary_text = await generate_summary(
             document["processed_text"],
-            summary_type=request.type
+            summary_type=request.type,
+            allow_fallback=False
         )
+        await artifact_store.put(document.get("content_hash"), "summary", request.type, {"summary_text": summary_text})
     except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Summarization failed: {str(e)}"
-        )
+        # Local fallback; not stored for reuse so identical uploads get a real summary later
+        print(f"⚠️ API summarization failed, using TF-IDF fallback: {str(e)}")
+        summary_text = generate_extractive_summary_tfidf(document["processed_text"])
     
     # Save summary to database
-    summary_dict = {
-        "document_id": request.document_id,
-        "summary_text": summary_text,
-        "summary_type": request.type,
-        "created_at": datetime.utcnow()
-    }
+    return await _save_summary(request.document_id, summary_text, request.type)
+
+@router.post("/summarize/stream")
+async def summarize_document_stream(
+    request: SummaryRequest,
+    user_id: str = Depends(get_current_user)
+):
+    """Stream a summary as server-sent events, saving it once complete"""
+    document = await _get_document_with_text(request.document_id, user_id)
+    text = document["processed_text"]
     
-    result = await summaries_collection.insert_one(summary_dict)
-    summary_dict["id"] = str(result.inserted_id)
+    content_hash = document.get("content_hash")
     
-    return Summary(**summary_dict)
+    async def event_stream():
+        cached = await artifact_store.get(content_hash, "summary", request.type)
+        if len(text.strip()) < 50:
+            summary_text = "Text too short to summarize."
+            yield _sse_event("delta", {"text": summary_text})
+        elif cached:
+            summary_text = cached["summary_text"]
+            yield _sse_event("delta", {"text": summary_text})
+        else:
+            parts = []
+            try:
+                async for delta in stream_summary_with_api(text, request.type):
+                    parts.append(delta)
+                    yield _sse_event("delta", {"text": delta})
+                summary_text = ''.join(parts).strip()
+                await artifact_store.put(content_hash, "summary", request.type, {"summary_text": summary_text})
+            except Exception as e:
+                if parts:
+                    yield _sse_event("error", {"detail": f"Summarization failed: {str(e)}"})
+                    return
+                # Same local fallback as the non-streaming endpoint
+                print(f"⚠️ API summarization failed, using TF-IDF fallback: {str(e)}")
+                summary_text = generate_extractive_summary_tfidf(text)
+                yield _sse_event("delta", {"text": summary_text})
+        
+        summary = await _save_summary(request.document_id, summary_text, request.type)
+        yield _sse_event("done", summary)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @router.get("/summaries/{document_id}", response_model=List[Summary])
 async def get_summaries(
@@ -75,7 +231,7 @@ async def get_summaries(
     document = await documents_collection.find_one({
         "_id": ObjectId(document_id),
         "user_id": user_id
-    })
+    }, {"_id": 1})
     
     if not document:
         raise HTTPException(
@@ -83,12 +239,12 @@ async def get_summaries(
             detail="Document not found"
         )
     
-    # Get summaries
+    # Get summaries (stored by _save_summary, so they're built without re-validation)
     summaries = []
-    cursor = summaries_collection.find({"document_id": document_id}).sort("created_at", -1)
+    cursor = summaries_collection.find({"document_id": document_id}, SUMMARY_HISTORY_PROJECTION).sort("created_at", -1)
     
     async for summary in cursor:
-        summaries.append(Summary(
+        summaries.append(Summary.model_construct(
             id=str(summary["_id"]),
             document_id=summary["document_id"],
             summary_text=summary["summary_text"],
@@ -96,7 +252,7 @@ async def get_summaries(
             created_at=summary["created_at"]
         ))
     
-    return summaries
+    return trusted_response(summaries)
 
 @router.post("/explain", response_model=Explanation)
 async def explain_text(
@@ -129,29 +285,17 @@ async def explain_text(
         )
     
     # Save explanation to database
-    explanation_dict = {
-        "document_id": request.document_id,
-        "original_text": request.text,
-        "explained_text": explained_text,
-        "tone": request.tone,
-        "created_at": datetime.utcnow()
-    }
-    
-    result = await explanations_collection.insert_one(explanation_dict)
-    explanation_dict["id"] = str(result.inserted_id)
-    
-    return Explanation(**explanation_dict)
-
+    return await _save_explanation(request.document_id, request.text, explained_text, request.tone)
 
-@router.post("/study-notes/{document_id}", response_model=StudyNotesResponse)
-async def generate_study_notes(
-    document_id: str,
+@router.post("/explain/stream")
+async def explain_text_stream(
+    request: ExplanationRequest,
     user_id: str = Depends(get_current_user)
 ):
-    """Generate exam-ready key points and short notes for a document"""
-    # Get document
+    """Stream an explanation as server-sent events, saving it once complete"""
+    # Verify document ownership
     document = await documents_collection.find_one({
-        "_id": ObjectId(document_id),
+        "_id": ObjectId(request.document_id),
         "user_id": user_id
     })
     
@@ -161,25 +305,106 @@ async def generate_study_notes(
             detail="Document not found"
         )
     
-    if not document.get("processed_text"):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Document text not available"
-        )
+    async def event_stream():
+        if not request.text or len(request.text.strip()) < 10:
+            explained_text = "Text too short to explain."
+            yield _sse_event("delta", {"text": explained_text})
+        else:
+            parts = []
+            try:
+                async for delta in stream_explanation_with_api(request.text, request.tone):
+                    parts.append(delta)
+                    yield _sse_event("delta", {"text": delta})
+            except Exception as e:
+                yield _sse_event("error", {"detail": f"Explanation failed: {str(e)}"})
+                return
+            explained_text = ''.join(parts).strip()
+        
+        explanation = await _save_explanation(request.document_id, request.text, explained_text, request.tone)
+        yield _sse_event("done", explanation)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/study-notes/{document_id}", response_model=StudyNotesResponse)
+async def generate_study_notes(
+    document_id: str,
+    mode: str = Query(STUDY_NOTES_MODE, pattern="^(parallel|combined)$"),
+    user_id: str = Depends(get_current_user)
+):
+    """Generate exam-ready key points and short notes for a document"""
+    document = await _get_document_with_text(document_id, user_id)
+    
+    # Reuse notes generated for an identical upload
+    cached = await artifact_store.get(document.get("content_hash"), "study_notes", "exam")
+    if cached:
+        return StudyNotesResponse(**cached)
     
     # Generate key points and short notes
     try:
         print(f"📚 Generating study notes for document: {document.get('filename', 'Unknown')}")
-        key_points = await generate_key_points_with_api(document["processed_text"])
-        short_notes = await generate_short_notes_with_api(document["processed_text"])
-        
-        return StudyNotesResponse(
-            key_points=key_points,
-            short_notes=short_notes
+        notes = await generate_study_notes_with_api(
+            document["processed_text"],
+            combined=(mode == "combined")
         )
+        
+        await artifact_store.put(document.get("content_hash"), "study_notes", "exam", notes)
+        return StudyNotesResponse(**notes)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Study notes generation failed: {str(e)}"
         )
 
+
+@router.post("/study-notes/{document_id}/stream")
+async def generate_study_notes_stream(
+    document_id: str,
+    user_id: str = Depends(get_current_user)
+):
+    """Stream key points and then short notes as server-sent events"""
+    document = await _get_document_with_text(document_id, user_id)
+    text = document["processed_text"]
+    
+    content_hash = document.get("content_hash")
+    
+    async def event_stream():
+        cached = await artifact_store.get(content_hash, "study_notes", "exam")
+        if cached:
+            for section in ("key_points", "short_notes"):
+                yield _sse_event("delta", {"section": section, "text": cached[section]})
+            yield _sse_event("done", StudyNotesResponse(**cached))
+            return
+        
+        print(f"📚 Streaming study notes for document: {document.get('filename', 'Unknown')}")
+        sections = {}
+        for section, stream in (
+            ("key_points", stream_key_points_with_api),
+            ("short_notes", stream_short_notes_with_api),
+        ):
+            parts = []
+            try:
+                async for delta in stream(text):
+                    parts.append(delta)
+                    yield _sse_event("delta", {"section": section, "text": delta})
+            except Exception as e:
+                yield _sse_event("error", {"detail": f"Study notes generation failed: {str(e)}"})
+                return
+            sections[section] = ''.join(parts)
+        
+        await artifact_store.put(content_hash, "study_notes", "exam", sections)
+        yield _sse_event("done", StudyNotesResponse(**sections))
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/stats")
+async def get_nlp_stats(user_id: str = Depends(get_current_user)):
+    """Operational counters for the LLM layer"""
+    return {
+        "cache": llm_cache.get_stats(),
+        "providers": provider_router.get_stats(),
+        "hedging": provider_router.get_hedge_stats(),
+        "scheduler": llm_scheduler.get_stats(),
+        "single_flight": single_flight.get_stats()
+    }
@@ -0,0 +1,63 @@
+"""
+LLM outputs derived from a document's content, shared across identical uploads.
+
+Summaries and study notes depend only on the extracted text (i.e. on the
+upload's content hash), the requested variant and the prompt templates. They
+are stored in `derived_artifacts` under that key so a second student uploading
+the same lecture gets the stored result instead of a new LLM call.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from app.models.database import database
+from nlp_modules.api_client import PROMPT_TEMPLATE_VERSION
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARTIFACT_TTL_DAYS = int(os.getenv("ARTIFACT_TTL_DAYS", 30))
+
+artifacts_collection = database.get_collection("derived_artifacts")
+
+
+class ArtifactStore:
+    """
+    Content-addressed cache of generated summaries and study notes
+    """
+    def _key(self, content_hash: str, kind: str, variant: str) -> dict:
+        return {
+            "content_hash": content_hash,
+            "kind": kind,
+            "variant": variant,
+            "template_version": PROMPT_TEMPLATE_VERSION,
+        }
+
+    async def get(self, content_hash: Optional[str], kind: str, variant: str) -> Optional[dict]:
+        """Stored payload for the content, or None"""
+        if not content_hash:
+            return None
+        artifact = await artifacts_collection.find_one({
+            **self._key(content_hash, kind, variant),
+            "created_at": {"$gte": datetime.utcnow() - timedelta(days=ARTIFACT_TTL_DAYS)},
+        })
+        if artifact:
+            print(f"♻️ Reusing {kind} ({variant}) generated for identical content")
+            return artifact["payload"]
+        return None
+
+    async def put(self, content_hash: Optional[str], kind: str, variant: str, payload: dict):
+        if not content_hash:
+            return
+        key = self._key(content_hash, kind, variant)
+        await artifacts_collection.update_one(
+            key,
+            {"$set": {**key, "payload": payload, "created_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def delete(self, content_hash: str):
+        await artifacts_collection.delete_many({"content_hash": content_hash})
+
+
+# Create singleton instance
+artifact_store = ArtifactStore()
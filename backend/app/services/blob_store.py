@@ -0,0 +1,115 @@
+"""
+Content-addressed storage for uploaded files.
+
+Uploads are stored once per SHA-256 under UPLOAD_DIR/blobs/ and shared by
+every document with the same bytes. The `blobs` collection holds one record
+per content hash with a reference count and what ingestion derived from the
+file (page layout, PDF preview), so a re-upload of known content skips both
+the disk write and extraction. The blob, its page text, its cached LLM
+artifacts and its rendered page images are removed when the last document referencing it is deleted.
+"""
+import os
+import uuid
+from datetime import datetime
+from typing import Optional
+from fastapi import UploadFile
+from pymongo import ReturnDocument
+from app.models.database import database
+from app.services.uploads import save_upload
+from app.services.text_store import text_store
+from app.services.artifacts import artifact_store
+from app.services.render_cache import render_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+INCOMING_DIR = os.path.join(UPLOAD_DIR, "incoming")
+
+blobs_collection = database.get_collection("blobs")
+
+
+def blob_path(content_hash: str, file_extension: str) -> str:
+    # Two-character shards keep directories small
+    return os.path.join(BLOB_DIR, content_hash[:2], f"{content_hash}.{file_extension}")
+
+
+class BlobStore:
+    """
+    Reference-counted, deduplicated file storage
+    """
+    async def put(self, file: UploadFile, file_extension: str) -> dict:
+        """
+        Stream an upload to disk and take a reference on its blob.
+
+        Returns:
+            The blob record; 'refcount' == 1 means the content was new
+        """
+        incoming_path = os.path.join(INCOMING_DIR, f"{uuid.uuid4().hex}.{file_extension}")
+        size, content_hash = await save_upload(file, incoming_path)
+        path = blob_path(content_hash, file_extension)
+
+        blob = await blobs_collection.find_one_and_update(
+            {"_id": content_hash},
+            {
+                "$inc": {"refcount": 1},
+                "$setOnInsert": {
+                    "path": path,
+                    "file_type": file_extension,
+                    "size": size,
+                    "created_at": datetime.utcnow(),
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        if blob["refcount"] > 1 and os.path.exists(blob["path"]):
+            os.remove(incoming_path)
+            print(f"♻️ Reusing stored content {content_hash[:12]} ({blob['refcount']} references)")
+        else:
+            os.makedirs(os.path.dirname(blob["path"]), exist_ok=True)
+            os.replace(incoming_path, blob["path"])
+        return blob
+
+    async def get(self, content_hash: str) -> Optional[dict]:
+        return await blobs_collection.find_one({"_id": content_hash})
+
+    async def record_derived(self, content_hash: str, fields: dict):
+        """Remember what ingestion derived from the blob so identical uploads can reuse it"""
+        await blobs_collection.update_one({"_id": content_hash}, {"$set": fields})
+
+    async def release(self, content_hash: str) -> bool:
+        """
+        Drop one reference; delete the file and everything derived from it with the last one.
+
+        Returns:
+            False if no blob exists for content_hash (documents stored before deduplication)
+        """
+        blob = await blobs_collection.find_one_and_update(
+            {"_id": content_hash},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if blob is None:
+            return False
+
+        if blob["refcount"] > 0:
+            return True
+
+        # Only the caller that removes the record cleans up, even if releases race
+        removed = await blobs_collection.find_one_and_delete({"_id": content_hash, "refcount": {"$lte": 0}})
+        if removed:
+            for path in (removed.get("path"), removed.get("pdf_path")):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            await text_store.delete(content_hash)
+            await artifact_store.delete(content_hash)
+            await render_cache.delete(content_hash)
+            print(f"🗑️ Removed stored content {content_hash[:12]}")
+        return True
+
+
+# Create singleton instance
+blob_store = BlobStore()
@@ -0,0 +1,122 @@
+"""
+Negotiated response compression for JSON and text bodies.
+
+CompressionMiddleware compresses complete (single-message) responses of a
+compressible type once they reach COMPRESSION_MIN_BYTES, using brotli or gzip
+according to Accept-Encoding. Everything else passes through untouched:
+server-sent events (they must reach the browser as they are produced), file
+downloads and byte ranges (already compressed formats, and Content-Range
+refers to the uncompressed bytes), and anything already encoded. Starlette's
+GZipMiddleware can't be used as is because it also compresses and buffers
+streaming responses.
+"""
+import os
+import gzip
+import asyncio
+import brotli
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))  # 4-5 is the usual choice for dynamic content
+
+COMPRESS_IN_THREAD_BYTES = 262144  # Larger bodies are compressed off the event loop
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/markdown")
+
+
+def _accepted_encoding(accept_encoding: str):
+    """'br' or 'gzip' if the client accepts it (q > 0), preferring brotli"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def _vary_accept_encoding(headers: list) -> list:
+    """Headers with Accept-Encoding merged into Vary"""
+    vary = [value for key, value in headers if key.lower() == b"vary"]
+    if any(b"accept-encoding" in value.lower() for value in vary):
+        return headers
+    headers = [(key, value) for key, value in headers if key.lower() != b"vary"]
+    return headers + [(b"vary", b", ".join(vary + [b"Accept-Encoding"]))]
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing whole JSON/text responses above a size threshold
+    """
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        encoding = _accepted_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+
+        start_message = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                return await send(message)
+
+            if message["type"] == "http.response.start":
+                response_headers = {key.lower(): value for key, value in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                if (
+                    message["status"] != 200
+                    or b"content-encoding" in response_headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    passthrough = True
+                    return await send(message)
+                # Whether or not this copy ends up compressed, it depends on Accept-Encoding,
+                # so shared caches must not hand it to clients with a different one
+                start_message = {**message, "headers": _vary_accept_encoding(list(message.get("headers", [])))}
+                return  # Held until we know whether the body qualifies
+
+            body = message.get("body", b"")
+            passthrough = True
+            if encoding is None or message.get("more_body", False) or len(body) < self.minimum_size:
+                # Not accepted, streamed or small: send as produced
+                await send(start_message)
+                return await send(message)
+
+            if len(body) >= COMPRESS_IN_THREAD_BYTES:
+                compressed = await asyncio.to_thread(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            response_headers = [
+                (key, value) for key, value in start_message["headers"]
+                if key.lower() != b"content-length"
+            ]
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            await send({**start_message, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
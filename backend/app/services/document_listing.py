@@ -0,0 +1,84 @@
+"""
+Slim, keyset-paginated document listings.
+
+File lists only need a handful of metadata fields, so listings project
+exactly those and never touch extracted text (full text comes from
+GET /api/documents/{id}). Pages are ordered newest first by
+(uploaded_at, _id) and continued with an opaque cursor naming the last
+record returned, so every page costs one index range scan of at most
+`limit` records no matter how many documents a user has or how far they
+have scrolled.
+"""
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from app.models.database import documents_collection
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class DocumentSummary(BaseModel):
+    id: str
+    user_id: str
+    filename: str
+    file_type: str
+    folder_id: Optional[str] = None
+    uploaded_at: datetime
+    status: Optional[str] = None
+    file_size: Optional[int] = None
+    page_count: Optional[int] = None
+
+
+SUMMARY_PROJECTION = {field: 1 for field in DocumentSummary.model_fields if field != "id"}
+
+
+def encode_cursor(document: dict) -> str:
+    key = f"{document['uploaded_at'].isoformat()}|{document['_id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        uploaded_at, document_id = key.split("|")
+        return datetime.fromisoformat(uploaded_at), ObjectId(document_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+async def list_documents(query: dict, cursor: Optional[str], limit: int) -> Tuple[List[DocumentSummary], Optional[str]]:
+    """
+    One page of document summaries matching query, newest first.
+
+    Returns:
+        (summaries, cursor for the next page or None on the last page)
+    """
+    query = dict(query)
+    if cursor:
+        uploaded_at, document_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"uploaded_at": {"$lt": uploaded_at}},
+            {"uploaded_at": uploaded_at, "_id": {"$lt": document_id}},
+        ]
+
+    # One extra record tells whether another page exists
+    records = await documents_collection.find(query, SUMMARY_PROJECTION) \
+        .sort([("uploaded_at", -1), ("_id", -1)]) \
+        .limit(limit + 1) \
+        .to_list(limit + 1)
+
+    next_cursor = encode_cursor(records[limit - 1]) if len(records) > limit else None
+    # Records come from our own writes and the projection above: no need to validate them again
+    summaries = [
+        DocumentSummary.model_construct(id=str(record.pop("_id")), **record)
+        for record in records[:limit]
+    ]
+    return summaries, next_cursor
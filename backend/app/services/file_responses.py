@@ -0,0 +1,166 @@
+"""
+File responses with HTTP validators and byte ranges.
+
+Starlette's FileResponse (0.27) always sends the whole file and derives its
+ETag from the file's mtime. serve_file adds what viewers need on top:
+  - a caller-supplied strong ETag (content hash) and Last-Modified
+  - 304 Not Modified for matching If-None-Match / If-Modified-Since
+  - Range requests answered with 206 Partial Content (one range; If-Range
+    honoured), or 416 when the range is unsatisfiable
+so a reopened file costs a 304 and PDF.js can load a linearized PDF in
+pieces instead of downloading it whole.
+"""
+import os
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+import aiofiles
+from fastapi import Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+from app.services.uploads import UPLOAD_CHUNK_SIZE
+
+RANGE_HEADERS = ["Accept-Ranges", "Content-Range", "Content-Length", "ETag", "Last-Modified"]
+
+
+def http_date(moment: datetime) -> str:
+    """RFC 7231 date for a naive UTC datetime (as stored in Mongo)"""
+    return formatdate(moment.replace(tzinfo=timezone.utc).timestamp(), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/"x" matches "x" """
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have one-second precision
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single 'bytes=' range into an inclusive (start, end).
+
+    Returns:
+        None if the header should be ignored (malformed or multiple ranges)
+
+    Raises:
+        ValueError: the range lies outside the file
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, _, last = (part.strip() for part in ranges.partition("-"))
+    if not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _range_applies(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """If-Range: only serve a range if the client's copy is still current"""
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag  # Strong comparison
+    if last_modified:
+        try:
+            return parsedate_to_datetime(if_range) == last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def _read_range(path: str, start: int, end: int):
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(
+    request: Request,
+    path: str,
+    media_type: str,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    cache_control: str = "private, no-cache",
+    headers: Optional[dict] = None,
+) -> Response:
+    """
+    Respond with a file, a 304, or a byte range of it.
+
+    Args:
+        request: The incoming request (for conditional and Range headers)
+        path: File to serve
+        media_type: Content-Type
+        etag: Strong ETag including quotes, e.g. '"<content hash>"'
+        last_modified: Naive UTC time the content was created
+        cache_control: Cache-Control for all responses
+        headers: Extra headers (e.g. Content-Disposition) for 200 and 206
+    """
+    validators = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if last_modified:
+        validators["Last-Modified"] = http_date(last_modified)
+
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validators)
+
+    size = os.path.getsize(path)
+    range_header = request.headers.get("range")
+    if range_header and _range_applies(request, etag, last_modified):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**validators, "Content-Range": f"bytes */{size}"}
+            )
+        if byte_range:
+            start, end = byte_range
+            return StreamingResponse(
+                _read_range(path, start, end),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type,
+                headers={
+                    **(headers or {}),
+                    **validators,
+                    "Content-Range": f"bytes {start}-{end}/{size}",
+                    "Content-Length": str(end - start + 1),
+                }
+            )
+
+    return FileResponse(path=path, media_type=media_type, headers={**(headers or {}), **validators})
@@ -0,0 +1,89 @@
+"""
+Document counts per folder.
+
+Counts for any number of folders come from a single `$group` aggregation
+over `documents`. With FOLDER_DOCUMENT_COUNTERS enabled, each folder record
+also carries a denormalized `document_count`, moved with `$inc` whenever a
+document is added to or removed from the folder, and listings read that
+instead of aggregating. `repair()` recomputes the stored counters from the
+documents themselves; run it when enabling the counters and whenever they
+may have drifted (e.g. after a crash between a document write and its $inc).
+"""
+import os
+from typing import Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.models.database import database, documents_collection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FOLDER_DOCUMENT_COUNTERS = os.getenv("FOLDER_DOCUMENT_COUNTERS", "false").lower() == "true"
+
+folders_collection = database.get_collection("folders")
+
+
+class FolderCounter:
+    """
+    Batch counting and optional stored counters for folder document counts
+    """
+    def __init__(self, maintain_counters: bool = FOLDER_DOCUMENT_COUNTERS):
+        self.maintain_counters = maintain_counters
+
+    async def aggregate(self, match: dict) -> dict:
+        """Folder id -> number of documents, for the documents matching `match`, in one query"""
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$folder_id", "count": {"$sum": 1}}},
+        ]
+        return {group["_id"]: group["count"] async for group in documents_collection.aggregate(pipeline)}
+
+    async def counts(self, user_id: str, folders: list) -> dict:
+        """Folder id -> document count for the given folder records"""
+        folder_ids = [str(folder["_id"]) for folder in folders]
+        if self.maintain_counters and all("document_count" in folder for folder in folders):
+            return {folder_id: folder["document_count"] for folder_id, folder in zip(folder_ids, folders)}
+
+        counts = await self.aggregate({"user_id": user_id, "folder_id": {"$in": folder_ids}})
+        return {folder_id: counts.get(folder_id, 0) for folder_id in folder_ids}
+
+    def initial_fields(self) -> dict:
+        """Fields for a newly created folder record"""
+        return {"document_count": 0} if self.maintain_counters else {}
+
+    async def adjust(self, folder_id: Optional[str], delta: int):
+        """Apply a change in a folder's document count to its stored counter"""
+        if not self.maintain_counters or not folder_id or not delta:
+            return
+        try:
+            folder_object_id = ObjectId(folder_id)
+        except Exception:
+            return  # Documents can reference folder ids that were never valid
+        await folders_collection.update_one(
+            {"_id": folder_object_id, "document_count": {"$exists": True}},
+            {"$inc": {"document_count": delta}}
+        )
+
+    async def repair(self, user_id: Optional[str] = None) -> int:
+        """
+        Recompute stored counters from the documents (all users, or one).
+
+        Returns:
+            Number of folders whose counter changed
+        """
+        folder_query = {"user_id": user_id} if user_id else {}
+        counts = await self.aggregate({**folder_query, "folder_id": {"$exists": True}})
+
+        requests = []
+        async for folder in folders_collection.find(folder_query, {"document_count": 1}):
+            count = counts.get(str(folder["_id"]), 0)
+            if folder.get("document_count") != count:
+                requests.append(UpdateOne({"_id": folder["_id"]}, {"$set": {"document_count": count}}))
+
+        if requests:
+            await folders_collection.bulk_write(requests, ordered=False)
+        return len(requests)
+
+
+# Create singleton instance
+folder_counter = FolderCounter()
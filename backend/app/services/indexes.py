@@ -0,0 +1,146 @@
+"""
+Declared MongoDB indexes, created at startup.
+
+Every hot query in the routers and services has an index listed in
+INDEXES. create_indexes is idempotent, so startup only builds what is
+missing. Builds run in a background task so the API serves immediately, and
+a build that fails (e.g. a unique index over existing duplicates, or an index
+that exists with different options) is reported instead of stopping the app.
+Status is served at GET /health/indexes.
+"""
+import os
+import asyncio
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from app.models.database import database
+from app.services.artifacts import ARTIFACT_TTL_DAYS
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXPLANATION_HISTORY_DAYS = int(os.getenv("EXPLANATION_HISTORY_DAYS", 90))
+
+DAY_SECONDS = 86400
+
+# Collection name -> indexes (and the queries they serve)
+INDEXES = {
+    "users": [
+        # Registration, login and forgot-password look users up by email
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "password_reset_tokens": [
+        IndexModel([("token_hash", ASCENDING)], name="token_hash_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        # Removed by MongoDB once expired
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "documents": [
+        # Listings: user (+ folder), newest first, keyset on (uploaded_at, _id); folder count aggregation
+        IndexModel(
+            [("user_id", ASCENDING), ("folder_id", ASCENDING), ("uploaded_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_folder_listing",
+        ),
+        IndexModel([("content_hash", ASCENDING)], name="content_hash"),
+    ],
+    "folders": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created_at"),
+        IndexModel([("user_id", ASCENDING), ("name", ASCENDING)], name="user_name"),
+    ],
+    "summaries": [
+        # Summary history, newest first, and the dedup upsert (unique, so racing upserts collide)
+        IndexModel([("document_id", ASCENDING), ("created_at", DESCENDING)], name="document_created_at"),
+        IndexModel(
+            [("document_id", ASCENDING), ("summary_type", ASCENDING), ("text_hash", ASCENDING)],
+            name="document_type_text_hash_unique",
+            unique=True,
+            # Rows saved before text_hash was recorded are left out
+            partialFilterExpression={"text_hash": {"$exists": True}},
+        ),
+    ],
+    "explanations": [
+        IndexModel(
+            [("document_id", ASCENDING), ("tone", ASCENDING), ("text_hash", ASCENDING)],
+            name="document_tone_text_hash_unique",
+            unique=True,
+            partialFilterExpression={"text_hash": {"$exists": True}},
+        ),
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=EXPLANATION_HISTORY_DAYS * DAY_SECONDS,
+        ),
+    ],
+    "ingestion_jobs": [
+        # Workers claim the oldest runnable job per stage
+        IndexModel([("stage", ASCENDING), ("created_at", ASCENDING)], name="stage_created_at"),
+        IndexModel([("document_id", ASCENDING)], name="document_id"),
+    ],
+    "document_pages": [
+        IndexModel([("content_hash", ASCENDING), ("page", ASCENDING)], name="content_hash_page_unique", unique=True),
+    ],
+    "derived_artifacts": [
+        IndexModel(
+            [("content_hash", ASCENDING), ("kind", ASCENDING), ("variant", ASCENDING), ("template_version", ASCENDING)],
+            name="artifact_key_unique",
+            unique=True,
+        ),
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=ARTIFACT_TTL_DAYS * DAY_SECONDS,
+        ),
+    ],
+    "llm_leases": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+class IndexManager:
+    """
+    Creates the declared indexes and keeps track of how each collection's build went
+    """
+    def __init__(self, indexes: dict = INDEXES):
+        self.indexes = indexes
+        self.status = {name: {"state": "pending"} for name in indexes}
+        self._task = None
+
+    async def ensure_collection(self, name: str):
+        self.status[name] = {"state": "building", "started_at": datetime.utcnow()}
+        try:
+            created = await database.get_collection(name).create_indexes(self.indexes[name])
+            self.status[name] = {"state": "ready", "indexes": created, "finished_at": datetime.utcnow()}
+        except PyMongoError as e:
+            self.status[name] = {"state": "failed", "error": str(e), "finished_at": datetime.utcnow()}
+            print(f"⚠️ Index build failed for {name}: {str(e)}")
+
+    async def ensure_all(self):
+        """Create missing indexes on every collection, one collection at a time"""
+        for name in self.indexes:
+            await self.ensure_collection(name)
+        failed = [name for name, status in self.status.items() if status["state"] == "failed"]
+        if failed:
+            print(f"⚠️ Indexes not built for: {', '.join(failed)}")
+        else:
+            print(f"🗂️ Indexes ready on {len(self.indexes)} collections")
+
+    def start(self):
+        """Build in the background so startup doesn't wait for large collections"""
+        self._task = asyncio.create_task(self.ensure_all())
+
+    async def report(self) -> dict:
+        """Build state per collection plus the indexes that currently exist"""
+        report = {}
+        for name, status in self.status.items():
+            entry = dict(status)
+            try:
+                entry["existing"] = sorted(await database.get_collection(name).index_information())
+            except PyMongoError as e:
+                entry["existing_error"] = str(e)
+            report[name] = entry
+        return report
+
+
+# Create singleton instance
+index_manager = IndexManager()
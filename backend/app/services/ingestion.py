@@ -0,0 +1,372 @@
+"""
+Asynchronous document ingestion.
+
+Uploads only persist the file and queue an ingestion job; text extraction and
+the rest of the processing run in background workers. Jobs live in Mongo
+(`ingestion_jobs`), so every API process runs its own workers against the
+same queue and a job whose worker died is picked up again once its lease
+expires. Each job records the stage it reached:
+
+    stored -> extracted -> recognized -> indexed      (or failed after the last retry)
+
+- stored: the upload is on disk and a document record exists without text
+  (content already ingested for an identical upload is reused, not re-extracted)
+- extracted: per-page text extracted and written to the text store
+- recognized: pages without a usable text layer (scans) OCR'd, if there were any
+- indexed: derived artifacts (PDF preview) done, document marked ready
+"""
+import os
+import uuid
+import asyncio
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+from bson import ObjectId
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from app.models.database import database, documents_collection
+from app.services.text_store import text_store
+from app.services.blob_store import blob_store
+from nlp_modules.text_extractor import extract_pages_from_file
+from nlp_modules.ocr import find_scanned_pages, ocr_available, ocr_scanned_pages
+from nlp_modules.process_pool import ExtractionQueueFull
+from nlp_modules.converter import convert_to_pdf
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 2))
+INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", 3))
+INGESTION_RETRY_BASE_SECONDS = float(os.getenv("INGESTION_RETRY_BASE_SECONDS", 5))
+INGESTION_LEASE_SECONDS = int(os.getenv("INGESTION_LEASE_SECONDS", 300))  # Renewed by the owner at every stage
+INGESTION_POLL_SECONDS = 2.0  # Idle workers re-check the queue for jobs queued by other processes
+INGESTION_BUSY_DELAY_SECONDS = 5.0  # Back-off when the extraction pool is saturated
+
+STORED = "stored"
+EXTRACTED = "extracted"
+RECOGNIZED = "recognized"
+INDEXED = "indexed"
+FAILED = "failed"
+
+jobs_collection = database.get_collection("ingestion_jobs")
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and another worker claimed it"""
+    pass
+
+
+class IngestionJob(BaseModel):
+    job_id: str
+    document_id: str
+    stage: str
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+def job_to_response(job: dict) -> IngestionJob:
+    return IngestionJob(
+        job_id=str(job["_id"]),
+        document_id=job["document_id"],
+        stage=job["stage"],
+        attempts=job.get("attempts", 0),
+        error=job.get("error"),
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+
+class IngestionQueue:
+    """
+    Mongo-backed job queue drained by a pool of asyncio workers
+    """
+    def __init__(self, workers: int = INGESTION_WORKERS):
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+
+    def _new_job(self, document_id: str, user_id: str, file_path: str, file_type: str) -> dict:
+        now = datetime.utcnow()
+        return {
+            "document_id": document_id,
+            "user_id": user_id,
+            "file_path": file_path,
+            "file_type": file_type,
+            "stage": STORED,
+            "attempts": 0,
+            "error": None,
+            "next_attempt_at": now,
+            "lease_expires_at": now,
+            "created_at": now,
+            "updated_at": now,
+            "stage_times": {STORED: now},
+        }
+
+    async def enqueue(self, document_id: str, user_id: str, file_path: str, file_type: str) -> dict:
+        """Create the job for a stored upload and wake a worker"""
+        job = self._new_job(document_id, user_id, file_path, file_type)
+        result = await jobs_collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        self._wakeup.set()
+        return job
+
+    async def enqueue_many(self, uploads: list) -> list:
+        """
+        Create jobs for several stored uploads with a single insert.
+
+        Args:
+            uploads: (document_id, user_id, file_path, file_type) tuples
+
+        Returns:
+            The job records, in the same order
+        """
+        jobs = [self._new_job(*upload) for upload in uploads]
+        if jobs:
+            result = await jobs_collection.insert_many(jobs)
+            for job, inserted_id in zip(jobs, result.inserted_ids):
+                job["_id"] = inserted_id
+            self._wakeup.set()
+        return jobs
+
+    async def retry(self, job_id: str, user_id: str) -> Optional[dict]:
+        """Requeue a failed job; None if there is no failed job with that id"""
+        now = datetime.utcnow()
+        job = await jobs_collection.find_one_and_update(
+            {"_id": ObjectId(job_id), "user_id": user_id, "stage": FAILED},
+            {"$set": {
+                "stage": STORED,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "lease_expires_at": now,
+                "updated_at": now,
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job:
+            await documents_collection.update_one(
+                {"_id": ObjectId(job["document_id"])},
+                {"$set": {"status": "processing"}}
+            )
+            self._wakeup.set()
+        return job
+
+    def start(self):
+        for _ in range(self.workers):
+            self._spawn_worker()
+        print(f"📥 Ingestion queue started with {self.workers} workers")
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn_worker(self):
+        task = asyncio.create_task(self._worker())
+        task.add_done_callback(self._worker_done)
+        self._tasks.append(task)
+
+    def _worker_done(self, task: asyncio.Task):
+        """Restart a worker that died so the queue keeps draining (stop() cancels them on purpose)"""
+        if task not in self._tasks:
+            return
+        self._tasks.remove(task)
+        if task.cancelled():
+            return
+        print(f"⚠️ Ingestion worker stopped unexpectedly ({task.exception()!r}), restarting")
+        self._spawn_worker()
+
+    async def _claim(self) -> Optional[dict]:
+        """Atomically take the oldest runnable job (new, due for retry, or abandoned by a dead worker)"""
+        now = datetime.utcnow()
+        return await jobs_collection.find_one_and_update(
+            {
+                "stage": {"$in": [STORED, EXTRACTED, RECOGNIZED]},
+                "next_attempt_at": {"$lte": now},
+                "lease_expires_at": {"$lte": now},
+            },
+            {"$set": {
+                "worker": self.worker_id,
+                # Identifies this claim: the process's other workers share worker_id
+                "lease_id": uuid.uuid4().hex,
+                "lease_expires_at": now + timedelta(seconds=INGESTION_LEASE_SECONDS),
+                "updated_at": now,
+            }},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                print(f"⚠️ Ingestion queue unavailable: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=INGESTION_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._handle(job)
+            except Exception as e:
+                # Couldn't record the outcome (e.g. Mongo unavailable): the job's lease
+                # expires and it is claimed again, so just keep the worker alive
+                print(f"⚠️ Ingestion job {job['_id']} left for retry: {str(e)}")
+
+    async def _handle(self, job: dict):
+        """Process a claimed job and record the outcome"""
+        try:
+            await self._process(job)
+        except LeaseLost:
+            # Another worker owns the job now; leave its progress alone
+            print(f"⚠️ Lost the lease on ingestion job {job['_id']}, stopping this run")
+        except ExtractionQueueFull:
+            await self._postpone(job)
+        except Exception as e:
+            await self._record_failure(job, e)
+
+    def _lease_filter(self, job: dict) -> dict:
+        """Matches the job only while this run still holds its lease"""
+        return {"_id": job["_id"], "lease_id": job.get("lease_id")}
+
+    async def _renew_lease(self, job: dict, **fields):
+        """
+        Extend this run's lease on a job (and set `fields` with it).
+
+        A stage that may outlast INGESTION_LEASE_SECONDS renews before it starts
+        and as it makes progress, so no other worker picks the job up meanwhile.
+
+        Raises:
+            LeaseLost: the lease had expired and another worker claimed the job
+        """
+        now = datetime.utcnow()
+        result = await jobs_collection.update_one(
+            self._lease_filter(job),
+            {"$set": {"lease_expires_at": now + timedelta(seconds=INGESTION_LEASE_SECONDS), "updated_at": now, **fields}}
+        )
+        if result.matched_count == 0:
+            raise LeaseLost(f"Job {job['_id']} was claimed by another worker")
+
+    async def _advance(self, job: dict, stage: str, **fields):
+        """Record the stage reached; renews the lease for the next stage"""
+        now = datetime.utcnow()
+        await self._renew_lease(job, stage=stage, **{f"stage_times.{stage}": now}, **fields)
+        job["stage"] = stage
+        job.update(fields)
+
+    async def _process(self, job: dict):
+        document_id = ObjectId(job["document_id"])
+        file_path = job["file_path"]
+        file_type = job["file_type"]
+
+        document = await documents_collection.find_one({"_id": document_id}, {"content_hash": 1})
+        if document is None:
+            raise Exception("Document was deleted before ingestion")
+        content_hash = document["content_hash"]
+        blob = await blob_store.get(content_hash) or {}
+
+        if job["stage"] == STORED:
+            await self._renew_lease(job)
+            scanned_pages = []
+            if blob.get("page_count") is not None:
+                # Identical content was ingested before; its page text is already stored
+                layout = {"page_count": blob["page_count"], "text_length": blob["text_length"]}
+            else:
+                pages = await extract_pages_from_file(file_path, file_type)
+                layout = await text_store.save_pages(content_hash, pages)
+                if file_type == "pdf":
+                    scanned_pages = find_scanned_pages(pages)
+            await documents_collection.update_one({"_id": document_id}, {"$set": layout})
+            await self._advance(job, EXTRACTED, scanned_pages=scanned_pages)
+
+        if job["stage"] == EXTRACTED:
+            await self._renew_lease(job)
+            scanned_pages = job.get("scanned_pages") or []
+            if scanned_pages and ocr_available():
+                print(f"🔍 OCR of {len(scanned_pages)} scanned pages in document {job['document_id']}")
+                recognized = await ocr_scanned_pages(
+                    file_path, scanned_pages, on_progress=lambda: self._renew_lease(job)
+                )
+                if recognized:
+                    layout = await text_store.replace_pages(content_hash, recognized)
+                    await documents_collection.update_one({"_id": document_id}, {"$set": layout})
+            elif scanned_pages:
+                print(f"⚠️ {len(scanned_pages)} pages without text in document {job['document_id']}, OCR unavailable")
+            if blob and blob.get("page_count") is None:
+                document = await documents_collection.find_one({"_id": document_id}, {"page_count": 1, "text_length": 1})
+                await blob_store.record_derived(
+                    content_hash,
+                    {"page_count": document["page_count"], "text_length": document["text_length"]}
+                )
+            await self._advance(job, RECOGNIZED)
+
+        # Convert DOCX/PPTX to PDF for preview
+        await self._renew_lease(job)
+        pdf_path = blob.get("pdf_path")
+        if "pdf_path" not in blob and file_type in ["docx", "pptx"]:
+            pdf_path = file_path.replace(f".{file_type}", "_preview.pdf")
+            success = await asyncio.to_thread(convert_to_pdf, file_path, pdf_path)
+            if not success:
+                pdf_path = None  # Conversion failed, will use original file
+            if blob:
+                await blob_store.record_derived(content_hash, {"pdf_path": pdf_path})
+
+        await documents_collection.update_one(
+            {"_id": document_id},
+            {"$set": {"pdf_path": pdf_path, "status": "ready"}}
+        )
+        await self._advance(job, INDEXED, error=None)
+        print(f"✅ Ingested document {job['document_id']}")
+
+    async def _postpone(self, job: dict):
+        """Hand the job back without using up an attempt; the pool is busy, not the file broken"""
+        now = datetime.utcnow()
+        await jobs_collection.update_one(
+            self._lease_filter(job),
+            {"$set": {
+                "next_attempt_at": now + timedelta(seconds=INGESTION_BUSY_DELAY_SECONDS),
+                "lease_expires_at": now,
+                "updated_at": now,
+            }}
+        )
+
+    async def _record_failure(self, job: dict, exc: Exception):
+        attempts = job.get("attempts", 0) + 1
+        now = datetime.utcnow()
+        update = {"attempts": attempts, "error": str(exc)[:500], "updated_at": now, "lease_expires_at": now}
+
+        retrying = attempts < INGESTION_MAX_ATTEMPTS
+        if retrying:
+            delay = INGESTION_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            update["next_attempt_at"] = now + timedelta(seconds=delay)
+        else:
+            update["stage"] = FAILED
+            update[f"stage_times.{FAILED}"] = now
+
+        result = await jobs_collection.update_one(self._lease_filter(job), {"$set": update})
+        if result.matched_count == 0:
+            # Another worker claimed the job after our lease expired; its run decides the outcome
+            print(f"⚠️ Lost the lease on ingestion job {job['_id']}, not recording the failure")
+            return
+
+        if retrying:
+            print(f"⚠️ Ingestion of {job['document_id']} failed (attempt {attempts}), retrying in {delay:.0f}s: {str(exc)}")
+        else:
+            print(f"❌ Ingestion of {job['document_id']} failed: {str(exc)}")
+            await documents_collection.update_one(
+                {"_id": ObjectId(job["document_id"])},
+                {"$set": {"status": "failed"}}
+            )
+
+
+# Create singleton instance
+ingestion_queue = IngestionQueue()
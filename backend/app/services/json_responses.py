@@ -0,0 +1,26 @@
+"""
+Fast JSON for responses built from our own database rows.
+
+Rows read back from Mongo were validated when they were written, so routes
+returning them build their models with model_construct (no validation) and
+wrap them in trusted_response. FastAPI returns a Response object as is,
+which skips the second validation pass it would otherwise run against the
+route's response_model (kept on the route for the OpenAPI schema), and
+orjson encodes the result.
+"""
+from typing import Any
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def _dump(content: Any) -> Any:
+    if isinstance(content, BaseModel):
+        return content.model_dump()
+    if isinstance(content, list):
+        return [_dump(item) for item in content]
+    return content
+
+
+def trusted_response(content: Any, status_code: int = 200, headers: dict = None) -> ORJSONResponse:
+    """ORJSONResponse for models (or lists of models) made with model_construct"""
+    return ORJSONResponse(_dump(content), status_code=status_code, headers=headers)
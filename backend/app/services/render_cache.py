@@ -0,0 +1,129 @@
+"""
+Disk cache of rendered page images.
+
+Images are stored under RENDER_CACHE_DIR keyed by (content hash, page, size),
+so identical uploads share them and a page is rendered at most once per size
+while it stays cached. Each hit refreshes the file's mtime; once the cache
+grows past RENDER_CACHE_MAX_BYTES the least recently used images are removed
+until it is back under 90% of the cap.
+"""
+import os
+import glob
+import asyncio
+from typing import Optional
+from nlp_modules.page_renderer import render_pdf_page, RENDER_SIZES
+from nlp_modules.process_pool import document_pool, DocumentProcessPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", "./cache/renders")
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 524288000))  # 500MB
+
+
+def _list_images() -> list:
+    """(mtime, size, path) of every cached image"""
+    images = []
+    for path in glob.glob(os.path.join(RENDER_CACHE_DIR, "*", "*.jpg")):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        images.append((stat.st_mtime, stat.st_size, path))
+    return images
+
+
+class RenderCache:
+    """
+    Render-on-demand page images with a size-capped LRU disk cache
+    """
+    def __init__(self, pool: DocumentProcessPool = document_pool, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.pool = pool
+        self.max_bytes = max_bytes
+        self._bytes: Optional[int] = None  # Total size on disk, counted on first use
+        self._inflight = {}  # Image path -> future, so concurrent requests render once
+        self._evicting = False
+
+    def image_path(self, content_hash: str, page_number: int, size: str) -> str:
+        return os.path.join(RENDER_CACHE_DIR, content_hash[:2], f"{content_hash}-{page_number}-{size}.jpg")
+
+    async def get(self, content_hash: str, source_path: str, page_number: int, size: str) -> str:
+        """
+        Path of the image for a page, rendering it first if it isn't cached.
+
+        Raises:
+            PageNotFound: page_number is outside the document
+            ExtractionQueueFull: the process pool is saturated
+        """
+        path = self.image_path(content_hash, page_number, size)
+        try:
+            os.utime(path)  # Mark as recently used
+            return path
+        except FileNotFoundError:
+            pass
+
+        if path in self._inflight:
+            await asyncio.shield(self._inflight[path])
+            return path
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[path] = future
+        try:
+            image_size = await self.pool.run(render_pdf_page, source_path, page_number, RENDER_SIZES[size], path)
+            future.set_result(path)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved here so waiter-less failures aren't logged
+            raise
+        finally:
+            del self._inflight[path]
+
+        await self._account(image_size)
+        return path
+
+    async def _account(self, added: int):
+        if self._bytes is None:
+            self._bytes = sum(size for _, size, _ in await asyncio.to_thread(_list_images))
+        else:
+            self._bytes += added
+
+        if self._bytes > self.max_bytes and not self._evicting:
+            self._evicting = True
+            try:
+                self._bytes = await asyncio.to_thread(self._evict)
+            finally:
+                self._evicting = False
+
+    def _evict(self) -> int:
+        """Remove least recently used images down to 90% of the cap; returns the new total"""
+        images = sorted(_list_images())
+        total = sum(size for _, size, _ in images)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in images:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        print(f"🧹 Evicted {removed} cached page images ({total / 1048576:.0f}MB kept)")
+        return total
+
+    async def delete(self, content_hash: str):
+        """Drop every cached image of a content hash"""
+        paths = glob.glob(os.path.join(RENDER_CACHE_DIR, content_hash[:2], f"{content_hash}-*.jpg"))
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            if self._bytes is not None:
+                self._bytes -= size
+
+
+# Create singleton instance
+render_cache = RenderCache()
@@ -0,0 +1,120 @@
+"""
+Page-indexed document text, stored apart from document metadata.
+
+Extracted text is kept as one record per page (PDF page, PPTX slide, or a
+fixed-size section of a DOCX) in the `document_pages` collection, keyed by the
+upload's content hash. Each page also records its character offsets into the
+full text (pages joined in order), so callers can load just a page range
+instead of the whole document, and huge files never approach Mongo's 16MB
+document limit.
+
+Page text of TEXT_COMPRESS_MIN_CHARS or more is stored zlib-compressed in
+`text_z` and only decompressed for the pages a caller actually reads. Records
+written before compression keep a plain `text` field and are read as-is.
+"""
+import os
+import zlib
+from typing import Optional
+from pymongo import ASCENDING, ReplaceOne
+from app.models.database import database
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TEXT_COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", 1))  # zlib level: 1 is fastest
+TEXT_COMPRESS_MIN_CHARS = 512  # Shorter pages gain little and are stored plain
+
+pages_collection = database.get_collection("document_pages")
+
+
+def encode_page_text(text: str) -> dict:
+    """Fields holding a page's text in its stored form"""
+    if len(text) < TEXT_COMPRESS_MIN_CHARS:
+        return {"text": text}
+    return {"text_z": zlib.compress(text.encode("utf-8"), TEXT_COMPRESSION_LEVEL)}
+
+
+def decode_page_text(record: dict) -> str:
+    if "text_z" in record:
+        return zlib.decompress(record["text_z"]).decode("utf-8")
+    return record.get("text", "")
+
+
+class TextStore:
+    """
+    Read and write per-page text for a content hash
+    """
+    async def save_pages(self, content_hash: str, pages: list) -> dict:
+        """
+        Replace the stored pages for content_hash.
+
+        Args:
+            content_hash: SHA-256 of the uploaded file
+            pages: Text of each page, in order
+
+        Returns:
+            dict with 'page_count' and 'text_length'
+        """
+        # Upserts keyed on (content_hash, page), so concurrent ingestion of identical uploads is harmless
+        requests = []
+        offset = 0
+        for number, text in enumerate(pages, start=1):
+            record = {
+                "content_hash": content_hash,
+                "page": number,
+                **encode_page_text(text),
+                "start": offset,
+                "end": offset + len(text),
+            }
+            requests.append(ReplaceOne({"content_hash": content_hash, "page": number}, record, upsert=True))
+            offset += len(text)
+
+        if requests:
+            await pages_collection.bulk_write(requests, ordered=False)
+        await pages_collection.delete_many({"content_hash": content_hash, "page": {"$gt": len(requests)}})
+        return {"page_count": len(requests), "text_length": offset}
+
+    async def replace_pages(self, content_hash: str, replacements: dict) -> dict:
+        """Swap in new text for some pages (page number -> text) and recompute the offsets"""
+        pages = [page["text"] for page in await self.get_pages(content_hash)]
+        for number, text in replacements.items():
+            pages[number - 1] = text
+        return await self.save_pages(content_hash, pages)
+
+    async def get_pages(self, content_hash: str, first: int = 1, last: Optional[int] = None) -> list:
+        """Pages first..last (1-based, inclusive) in order"""
+        query = {"content_hash": content_hash, "page": {"$gte": first}}
+        if last is not None:
+            query["page"]["$lte"] = last
+
+        cursor = pages_collection.find(query, {"_id": 0, "content_hash": 0}).sort("page", ASCENDING)
+        pages = []
+        async for record in cursor:
+            pages.append({
+                "page": record["page"],
+                "text": decode_page_text(record),
+                "start": record["start"],
+                "end": record["end"],
+            })
+        return pages
+
+    async def get_text(self, content_hash: str) -> str:
+        """The full text, all pages joined"""
+        return "".join(page["text"] for page in await self.get_pages(content_hash))
+
+    async def delete(self, content_hash: str):
+        await pages_collection.delete_many({"content_hash": content_hash})
+
+
+async def load_document_text(document: dict) -> Optional[str]:
+    """Full text of a document record, whether stored as pages or inline (older uploads)"""
+    if document.get("processed_text"):
+        return document["processed_text"]
+    # page_count: stored page by page; section_count: legacy text migrated after its file was gone
+    if (document.get("page_count") or document.get("section_count")) and document.get("content_hash"):
+        return await text_store.get_text(document["content_hash"])
+    return None
+
+
+# Create singleton instance
+text_store = TextStore()
@@ -0,0 +1,142 @@
+"""
+Size-limited, streaming upload handling.
+
+UploadSizeLimitMiddleware rejects oversized request bodies with 413 while they
+are still arriving (or straight away from Content-Length). save_upload then copies the
+parsed file to disk in fixed-size chunks, hashing it in the same pass, via a
+temp file that is atomically renamed into place, so memory use per upload
+stays constant regardless of file size.
+"""
+import os
+import hashlib
+import tempfile
+import aiofiles
+from fastapi import HTTPException, UploadFile, status
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10485760))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1048576))
+MULTIPART_OVERHEAD = 65536  # Boundaries and part headers around the file itself
+BATCH_UPLOAD_MAX_BYTES = int(os.getenv("BATCH_UPLOAD_MAX_BYTES", 209715200))  # 200MB per batch request
+
+TOO_LARGE_DETAIL = f"File too large (max {MAX_FILE_SIZE / 1048576:.0f}MB)"
+BATCH_TOO_LARGE_DETAIL = f"Upload batch too large (max {BATCH_UPLOAD_MAX_BYTES / 1048576:.0f}MB)"
+
+
+class _BodyTooLarge(HTTPException):
+    # An HTTPException so FastAPI's body parsing passes it through as a 413 instead of a 400
+    def __init__(self, detail: str):
+        super().__init__(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that stops reading a multipart body once it exceeds the upload limit
+    (a larger one for batch uploads, whose paths end in /batch)
+    """
+    def __init__(
+        self,
+        app,
+        max_body_size: int = MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+        max_batch_body_size: int = BATCH_UPLOAD_MAX_BYTES,
+    ):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.max_batch_body_size = max_batch_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        if scope["path"].rstrip("/").endswith("/batch"):
+            max_body_size, detail = self.max_batch_body_size, BATCH_TOO_LARGE_DETAIL
+        else:
+            max_body_size, detail = self.max_body_size, TOO_LARGE_DETAIL
+
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_body_size:
+            return await self._reject(send, detail)
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    raise _BodyTooLarge(detail)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            if not response_started:
+                await self._reject(send, detail)
+
+    async def _reject(self, send, detail: str):
+        body = ('{"detail":"%s"}' % detail).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def save_upload(file: UploadFile, file_path: str) -> tuple:
+    """
+    Stream an uploaded file to file_path in chunks, enforcing MAX_FILE_SIZE.
+
+    Args:
+        file: The uploaded file
+        file_path: Final location; only created once the whole upload was written
+
+    Returns:
+        (size in bytes, sha256 hex digest)
+    """
+    directory = os.path.dirname(file_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    os.close(fd)
+
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, 'wb') as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=TOO_LARGE_DETAIL
+                    )
+                sha256.update(chunk)
+                await f.write(chunk)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return size, sha256.hexdigest()
@@ -0,0 +1,103 @@
+"""
+Benchmark: one request per file vs a single batch upload
+
+Generates N small, distinct PDFs (so deduplication doesn't short-circuit
+anything) and uploads them to a running API twice: first one file per
+request, in sequence, the way the frontend used to add a folder of lecture
+notes, then all at once through POST /api/folders/{id}/documents/batch.
+For each run it reports the time until every upload was accepted and the
+time until every ingestion job reached 'indexed' or 'failed'.
+
+Usage (from backend/, with the API running):
+    python -m benchmarks.batch_upload --url http://localhost:8000 --token <JWT> --folder <folder id> --files 40
+"""
+import argparse
+import asyncio
+import time
+import uuid
+import fitz  # PyMuPDF
+import httpx
+
+PDF_TYPE = "application/pdf"
+LINE = "Enzymes lower the activation energy of a reaction without being consumed by it."
+
+
+def make_pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    marker = uuid.uuid4().hex  # Distinct bytes per file
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(
+            fitz.Rect(40, 40, page.rect.width - 40, page.rect.height - 40),
+            f"{marker} page {number + 1}\n" + "\n".join(LINE for _ in range(40)),
+            fontsize=9,
+        )
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+async def wait_for_jobs(client: httpx.AsyncClient, job_ids: list, poll: float = 0.25):
+    pending = set(job_ids)
+    while pending:
+        for job_id in list(pending):
+            response = await client.get(f"/api/documents/jobs/{job_id}")
+            response.raise_for_status()
+            if response.json()["stage"] in ("indexed", "failed"):
+                pending.discard(job_id)
+        if pending:
+            await asyncio.sleep(poll)
+
+
+async def upload_one_by_one(client: httpx.AsyncClient, folder: str, files: list) -> list:
+    job_ids = []
+    for name, data in files:
+        response = await client.post(
+            f"/api/folders/{folder}/documents",
+            files={"file": (name, data, PDF_TYPE)},
+        )
+        response.raise_for_status()
+        job_ids.append(response.json()["job_id"])
+    return job_ids
+
+
+async def upload_batch(client: httpx.AsyncClient, folder: str, files: list) -> list:
+    response = await client.post(
+        f"/api/folders/{folder}/documents/batch",
+        files=[("files", (name, data, PDF_TYPE)) for name, data in files],
+    )
+    response.raise_for_status()
+    return [item["job_id"] for item in response.json()["files"] if item["status"] == "queued"]
+
+
+async def run(upload, client: httpx.AsyncClient, folder: str, files: list) -> tuple:
+    started = time.perf_counter()
+    job_ids = await upload(client, folder, files)
+    accepted = time.perf_counter() - started
+    await wait_for_jobs(client, job_ids)
+    return accepted, time.perf_counter() - started, len(job_ids)
+
+
+async def main_async(args):
+    headers = {"Authorization": f"Bearer {args.token}"}
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, timeout=300) as client:
+        for label, upload in (("one request per file", upload_one_by_one), ("single batch request", upload_batch)):
+            files = [(f"bench-{i + 1}.pdf", make_pdf(args.pages)) for i in range(args.files)]
+            accepted, indexed, queued = await run(upload, client, args.folder, files)
+            print(f"  {label:22}: {queued} queued, accepted in {accepted:.2f}s, indexed in {indexed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="Access token from /api/auth/login")
+    parser.add_argument("--folder", required=True, help="Folder id to upload into")
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=5)
+    args = parser.parse_args()
+    print(f"Uploading {args.files} PDFs of {args.pages} pages to {args.url}")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark: JSON response encoding and bytes on the wire
+
+Serves the same database rows through two in-process FastAPI apps and
+compares the CPU spent per request:
+  validated  - models built with validation, re-validated against the
+               route's response_model and encoded by JSONResponse (json.dumps)
+  trusted    - models built with model_construct and returned through
+               trusted_response (orjson, no second validation pass)
+for a large document (GET /api/documents/{id}) and a long summary history
+(GET /api/nlp/summaries/{id}). It then reports the body size raw, gzip and
+brotli compressed at the levels CompressionMiddleware uses, and how long
+each compression takes.
+
+Usage (from backend/):
+    python -m benchmarks.json_responses --pdf lecture.pdf --summaries 500
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.models.schemas import Document, Summary
+from app.services.compression import compress, GZIP_LEVEL, BROTLI_QUALITY
+from app.services.json_responses import trusted_response
+from nlp_modules.text_extractor import extract_pdf_pages, count_pdf_pages
+from benchmarks.pdf_extraction import make_pdf
+
+SUMMARY_LENGTH = 1500  # Characters per stored summary
+
+
+def document_row(text: str) -> dict:
+    return {
+        "_id": ObjectId(),
+        "user_id": "user1",
+        "filename": "lecture.pdf",
+        "file_type": "pdf",
+        "folder_id": None,
+        "uploaded_at": datetime.utcnow(),
+        "processed_text": text,
+    }
+
+
+def summary_rows(text: str, count: int) -> list:
+    now = datetime.utcnow()
+    rows = []
+    for i in range(count):
+        offset = (i * SUMMARY_LENGTH) % max(len(text) - SUMMARY_LENGTH, 1)
+        rows.append({
+            "_id": ObjectId(),
+            "document_id": "doc1",
+            "summary_text": text[offset:offset + SUMMARY_LENGTH],
+            "summary_type": ("short", "medium", "detailed")[i % 3],
+            "created_at": now - timedelta(minutes=i),
+        })
+    return rows
+
+
+def document_fields(row: dict) -> dict:
+    return {
+        "id": str(row["_id"]), "user_id": row["user_id"], "filename": row["filename"],
+        "file_type": row["file_type"], "folder_id": row.get("folder_id"),
+        "uploaded_at": row["uploaded_at"], "processed_text": row["processed_text"],
+    }
+
+
+def summary_fields(row: dict) -> dict:
+    return {
+        "id": str(row["_id"]), "document_id": row["document_id"], "summary_text": row["summary_text"],
+        "summary_type": row["summary_type"], "created_at": row["created_at"],
+    }
+
+
+def build_apps(document: dict, summaries: list) -> tuple:
+    validated = FastAPI()
+
+    @validated.get("/document", response_model=Document)
+    async def validated_document():
+        return Document(**document_fields(document))
+
+    @validated.get("/summaries", response_model=List[Summary])
+    async def validated_summaries():
+        return [Summary(**summary_fields(row)) for row in summaries]
+
+    trusted = FastAPI()
+
+    @trusted.get("/document", response_model=Document)
+    async def trusted_document():
+        return trusted_response(Document.model_construct(**document_fields(document)))
+
+    @trusted.get("/summaries", response_model=List[Summary])
+    async def trusted_summaries():
+        return trusted_response([Summary.model_construct(**summary_fields(row)) for row in summaries])
+
+    return validated, trusted
+
+
+def time_requests(client: TestClient, path: str, repeats: int) -> tuple:
+    """(CPU seconds per request, response body)"""
+    body = client.get(path).content  # Warm up
+    started = time.process_time()
+    for _ in range(repeats):
+        client.get(path)
+    return (time.process_time() - started) / repeats, body
+
+
+def time_compress(body: bytes, encoding: str, repeats: int = 5) -> tuple:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        compressed = compress(body, encoding)
+    return len(compressed), (time.perf_counter() - started) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF whose text is used (default: synthetic 300 pages)")
+    parser.add_argument("--summaries", type=int, default=500, help="Length of the summary history")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.pdf
+        if not path:
+            path = os.path.join(directory, "synthetic.pdf")
+            make_pdf(path, 300)
+        text = "".join(extract_pdf_pages(path, 0, count_pdf_pages(path)))
+
+    validated, trusted = build_apps(document_row(text), summary_rows(text, args.summaries))
+    print(f"gzip level {GZIP_LEVEL}, brotli quality {BROTLI_QUALITY}")
+    for label, path in (
+        (f"Document, {len(text) / 1048576:.1f}MB of text", "/document"),
+        (f"Summary history, {args.summaries} summaries", "/summaries"),
+    ):
+        print(f"{label}:")
+        results = {}
+        for name, app in (("validated", validated), ("trusted", trusted)):
+            with TestClient(app) as client:
+                cpu, body = time_requests(client, path, args.repeats)
+            results[name] = cpu
+            print(f"  {name:9}: {cpu * 1000:7.2f}ms CPU per request")
+        print(f"  speedup  : {results['validated'] / results['trusted']:.1f}x")
+
+        print(f"  raw      : {len(body) / 1024:8.0f}KB")
+        for encoding in ("gzip", "br"):
+            size, seconds = time_compress(body, encoding)
+            print(f"  {encoding:9}: {size / 1024:8.0f}KB ({len(body) / size:.1f}x) in {seconds * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Load test: thread-wrapped vs native async LLM calls
+
+Runs N concurrent generate_with_fallback calls through the real api_client
+path (single-flight, provider router, scheduler slot, Groq SDK) with the
+provider's HTTP transport replaced by an httpx MockTransport that answers
+after LATENCY seconds. It compares the old way (synchronous Groq client
+inside asyncio.to_thread) with the new one (AsyncGroq on the shared async
+pool). While the load runs, a probe measures how long an unrelated
+asyncio.to_thread job (what aiofiles does for every file write) has to wait
+for an executor thread.
+
+Scheduler quotas are lifted for the simulated runs (concurrency = N, no
+RPM/TPM limit) so the numbers show the transport, not the free-tier quota.
+
+Usage (from backend/):
+    python -m benchmarks.llm_concurrency --requests 50 200 --latency 2
+    python -m benchmarks.llm_concurrency --live --requests 20   # real providers, uses quota
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from groq import AsyncGroq, Groq
+from nlp_modules import api_client
+from nlp_modules.provider_router import provider_router
+from nlp_modules.scheduler import llm_scheduler
+
+
+async def probe_executor(stop: asyncio.Event, samples: list):
+    """Measure the queueing delay of a trivial to_thread job every 100ms"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.to_thread(lambda: None)
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.1)
+
+
+async def run_load(call, requests: int) -> dict:
+    stop = asyncio.Event()
+    samples = []
+    probe = asyncio.create_task(probe_executor(stop, samples))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(call(i) for i in range(requests)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for result in results if isinstance(result, Exception))
+
+    stop.set()
+    await probe
+    samples.sort()
+    return {
+        "wall_time_s": round(elapsed, 2),
+        "throughput_rps": round((requests - failed) / elapsed, 1),
+        "failed": failed,
+        "probe_p50_ms": round(samples[len(samples) // 2] * 1000, 1) if samples else None,
+        "probe_max_ms": round(samples[-1] * 1000, 1) if samples else None,
+    }
+
+
+def completion_body(request: httpx.Request) -> dict:
+    return {
+        "id": "bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": json.loads(request.content)["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+    }
+
+
+def mock_groq_clients(latency: float) -> tuple:
+    """(AsyncGroq, Groq) whose HTTP transport answers every request after `latency` seconds"""
+    async def async_handler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json=completion_body(request))
+
+    def sync_handler(request):
+        time.sleep(latency)
+        return httpx.Response(200, json=completion_body(request))
+
+    async_client = AsyncGroq(
+        api_key="benchmark", max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(async_handler)),
+    )
+    sync_client = Groq(
+        api_key="benchmark", max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(sync_handler)),
+    )
+    return async_client, sync_client
+
+
+async def simulated(request_counts: list, latency: float):
+    async_client, sync_client = mock_groq_clients(latency)
+    native_generate = api_client._generate_with_groq
+
+    async def thread_bound_generate(prompt: str, max_tokens: int, temperature: float) -> str:
+        # Old path: the synchronous SDK call holds an executor thread for the whole generation
+        completion = await asyncio.to_thread(
+            sync_client.chat.completions.create,
+            messages=[{"role": "user", "content": prompt}],
+            model=api_client.GROQ_MODEL,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        return completion.choices[0].message.content
+
+    async def call(i):
+        await api_client.generate_with_fallback(
+            f"Reply with the number {i} and nothing else.",
+            max_tokens=8,
+            temperature=0.0,
+            use_cache=False,
+        )
+
+    api_client.gemini_model = None
+    api_client.groq_client = async_client
+    for requests in request_counts:
+        llm_scheduler.configure("groq", max_concurrency=requests)
+        print(f"Simulated load: {requests} concurrent generate_with_fallback calls, {latency}s provider latency")
+        for label, generate in (("native async      ", native_generate), ("asyncio.to_thread ", thread_bound_generate)):
+            provider_router._providers.pop("groq", None)  # Fresh circuit breaker state per run
+            api_client._generate_with_groq = generate
+            print(f"  {label}:", await run_load(call, requests))
+        api_client._generate_with_groq = native_generate
+
+
+async def live(requests: int):
+    async def call(i):
+        await api_client.generate_with_fallback(
+            f"Reply with the number {i} and nothing else.",
+            max_tokens=8,
+            temperature=0.0,
+            use_cache=False,
+        )
+
+    print(f"Live load: {requests} concurrent calls against the configured providers")
+    print("  native async      :", await run_load(call, requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, nargs="+", default=[50, 200], help="Concurrency levels")
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    if args.live:
+        asyncio.run(live(args.requests[0]))
+    else:
+        asyncio.run(simulated(args.requests, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: page-parallel PDF text extraction
+
+Generates a synthetic PDF (default 500 text-heavy pages) and times
+extract_pdf_parallel with process pools of increasing size, next to the
+single-process extract_pages baseline. Wall-clock time should drop roughly
+with the number of worker processes, up to the number of cores.
+
+Usage (from backend/):
+    python -m benchmarks.pdf_extraction --pages 500 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import fitz  # PyMuPDF
+from nlp_modules.process_pool import DocumentProcessPool
+from nlp_modules.text_extractor import extract_pages, extract_pdf_parallel
+
+LINE = "The mitochondria is the powerhouse of the cell; ATP synthesis couples proton flow to phosphorylation."
+
+
+def make_pdf(path: str, pages: int):
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(
+            fitz.Rect(40, 40, page.rect.width - 40, page.rect.height - 40),
+            f"Page {number + 1}\n" + "\n".join(LINE for _ in range(45)),
+            fontsize=9,
+        )
+    doc.save(path)
+    doc.close()
+
+
+async def time_pool(path: str, workers: int, repeats: int) -> float:
+    pool = DocumentProcessPool(workers=workers)
+    try:
+        await extract_pdf_parallel(path, pool)  # Warm-up: spawn the worker processes
+        started = time.perf_counter()
+        for _ in range(repeats):
+            await extract_pdf_parallel(path, pool)
+        return (time.perf_counter() - started) / repeats
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "synthetic.pdf")
+        make_pdf(path, args.pages)
+        print(f"Synthetic PDF: {args.pages} pages, {os.path.getsize(path) / 1048576:.1f}MB, {os.cpu_count()} cores")
+
+        started = time.perf_counter()
+        for _ in range(args.repeats):
+            extract_pages(path, "pdf")
+        baseline = (time.perf_counter() - started) / args.repeats
+        print(f"  in-process (sequential) : {baseline:.3f}s")
+
+        for workers in args.workers:
+            elapsed = asyncio.run(time_pool(path, workers, args.repeats))
+            print(f"  {workers} worker process(es)  : {elapsed:.3f}s  ({baseline / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: inline vs compressed out-of-line document text
+
+Extracts the text of a PDF (or a synthetic one) and compares the two storage
+layouts for N uploads of it:
+  inline     - one `documents` record per upload with the full processed_text
+  paged      - a slim `documents` record plus zlib-compressed `document_pages`
+               records per page (what app.services.text_store writes)
+
+Offline it reports BSON sizes, compression ratio and codec speed, and how
+long decoding a page of metadata listings takes in each layout. With --mongo
+it also loads both layouts into a scratch database and reports collStats
+sizes and the latency of a listing query that has no projection.
+
+Usage (from backend/):
+    python -m benchmarks.text_storage --pdf lecture.pdf --documents 200
+    python -m benchmarks.text_storage --pdf lecture.pdf --mongo mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+import bson
+from app.services.text_store import encode_page_text, decode_page_text
+from nlp_modules.text_extractor import extract_pdf_pages, count_pdf_pages
+from benchmarks.pdf_extraction import make_pdf
+
+LISTING_SIZE = 50  # Records per listing page
+
+
+def document_record(number: int, text_fields: dict) -> dict:
+    return {
+        "_id": bson.ObjectId(),
+        "user_id": f"user{number % 10}",
+        "folder_id": None,
+        "filename": f"lecture-{number}.pdf",
+        "file_type": "pdf",
+        "file_path": f"./uploads/blobs/ab/{number:064x}.pdf",
+        "file_size": 1048576,
+        "content_hash": f"{number:064x}",
+        "pdf_path": None,
+        "status": "ready",
+        "uploaded_at": datetime.utcnow(),
+        **text_fields,
+    }
+
+
+def layouts(pages: list, documents: int) -> tuple:
+    text = "".join(pages)
+    inline = [document_record(i, {"processed_text": text}) for i in range(documents)]
+    paged = [document_record(i, {"page_count": len(pages), "text_length": len(text)}) for i in range(documents)]
+    page_records = []
+    for i in range(documents):
+        offset = 0
+        for number, page in enumerate(pages, start=1):
+            page_records.append({
+                "content_hash": f"{i:064x}", "page": number, **encode_page_text(page),
+                "start": offset, "end": offset + len(page),
+            })
+            offset += len(page)
+    return inline, paged, page_records
+
+
+def encoded_size(records: list) -> int:
+    return sum(len(bson.encode(record)) for record in records)
+
+
+def time_decode(records: list, repeats: int = 20) -> float:
+    """Client-side cost of receiving one listing page: BSON decode of LISTING_SIZE records"""
+    data = b"".join(bson.encode(record) for record in records[:LISTING_SIZE])
+    started = time.perf_counter()
+    for _ in range(repeats):
+        bson.decode_all(data)
+    return (time.perf_counter() - started) / repeats
+
+
+async def measure_mongo(url: str, inline: list, paged: list, page_records: list):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(url)
+    database = client[f"text_storage_bench_{os.getpid()}"]
+    try:
+        await database.inline_documents.insert_many(inline)
+        await database.paged_documents.insert_many(paged)
+        await database.document_pages.insert_many(page_records)
+        await database.inline_documents.create_index("user_id")
+        await database.paged_documents.create_index("user_id")
+        for name in ("inline_documents", "paged_documents", "document_pages"):
+            stats = await database.command("collStats", name)
+            print(f"  {name:17} data {stats['size'] / 1048576:8.2f}MB  on disk {stats['storageSize'] / 1048576:8.2f}MB  avg record {stats.get('avgObjSize', 0) / 1024:7.1f}KB")
+
+        for name in ("inline_documents", "paged_documents"):
+            timings = []
+            for _ in range(20):
+                started = time.perf_counter()
+                await database[name].find({"user_id": "user1"}).limit(LISTING_SIZE).to_list(LISTING_SIZE)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f"  listing from {name:17}: p50 {timings[10] * 1000:6.2f}ms  p95 {timings[18] * 1000:6.2f}ms")
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF whose text is used (default: synthetic 100 pages)")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--mongo", help="MongoDB URL for collection size and query latency numbers")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.pdf
+        if not path:
+            path = os.path.join(directory, "synthetic.pdf")
+            make_pdf(path, 100)
+        pages = extract_pdf_pages(path, 0, count_pdf_pages(path))
+
+    text = "".join(pages)
+    started = time.perf_counter()
+    encoded = [encode_page_text(page) for page in pages]
+    encode_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for record in encoded:
+        decode_page_text(record)
+    decode_time = time.perf_counter() - started
+    stored = sum(len(record.get("text_z", b"")) or len(record.get("text", "").encode("utf-8")) for record in encoded)
+    raw = len(text.encode("utf-8"))
+    print(f"Text: {len(pages)} pages, {raw / 1024:.0f}KB -> {stored / 1024:.0f}KB stored ({raw / max(stored, 1):.1f}x)")
+    print(f"  compress {raw / 1048576 / encode_time:.0f}MB/s, decompress {raw / 1048576 / decode_time:.0f}MB/s")
+
+    inline, paged, page_records = layouts(pages, args.documents)
+    print(f"{args.documents} uploads:")
+    print(f"  documents, inline text   : {encoded_size(inline) / 1048576:8.2f}MB  ({encoded_size(inline[:1]) / 1024:.1f}KB per record)")
+    print(f"  documents, text paged out: {encoded_size(paged) / 1048576:8.2f}MB  ({encoded_size(paged[:1]) / 1024:.2f}KB per record)")
+    print(f"  document_pages (zlib)    : {encoded_size(page_records) / 1048576:8.2f}MB")
+    print(f"Decoding a {LISTING_SIZE}-record listing without projection:")
+    print(f"  inline {time_decode(inline) * 1000:.2f}ms, paged out {time_decode(paged) * 1000:.3f}ms")
+
+    if args.mongo:
+        print(f"MongoDB ({args.mongo}):")
+        asyncio.run(measure_mongo(args.mongo, inline, paged, page_records))
+
+
+if __name__ == "__main__":
+    main()
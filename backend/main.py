@@ -1,6 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.routers import auth, documents, nlp_processing, folders
+from app.models.database import database
+from app.services.ingestion import ingestion_queue
+from app.services.indexes import index_manager
+from app.services.uploads import UploadSizeLimitMiddleware
+from app.services.document_listing import NEXT_CURSOR_HEADER
+from app.services.file_responses import RANGE_HEADERS
+from app.services.compression import CompressionMiddleware
+from nlp_modules.single_flight import single_flight
+from nlp_modules.process_pool import document_pool
 import uvicorn
 import os
 from dotenv import load_dotenv
@@ -11,9 +21,19 @@ load_dotenv()
 app = FastAPI(
     title="DoCchat API",
     description="AI-Powered Learning Assistant Backend",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # orjson instead of json.dumps for every JSON route
 )
 
+# Middleware added later wraps earlier ones: these are registered before CORS so that
+# CORS headers also reach their responses (e.g. an early 413)
+
+# Reject oversized uploads while they stream in instead of after buffering them
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# br/gzip for large JSON and text bodies; streams (SSE) and files pass through as they are
+app.add_middleware(CompressionMiddleware)
+
 # CORS Configuration
 frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
 allowed_origins = [
@@ -27,6 +47,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, *RANGE_HEADERS],  # Listing pagination, ranged file loads (PDF.js)
 )
 
 # Include routers
@@ -35,6 +56,25 @@ app.include_router(folders.router, prefix="/api/folders", tags=["Folders"])
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
 app.include_router(nlp_processing.router, prefix="/api/nlp", tags=["NLP Processing"])
 
+@app.on_event("startup")
+async def ensure_indexes():
+    # Builds missing indexes in the background; progress at /health/indexes
+    index_manager.start()
+
+@app.on_event("startup")
+async def configure_llm_coordination():
+    # Lease documents let workers coalesce identical LLM requests (LLM_SINGLE_FLIGHT_MODE=mongo)
+    single_flight.configure_leases(database.get_collection("llm_leases"))
+
+@app.on_event("startup")
+async def start_ingestion_workers():
+    ingestion_queue.start()
+
+@app.on_event("shutdown")
+async def stop_ingestion_workers():
+    await ingestion_queue.stop()
+    document_pool.shutdown()
+
 @app.get("/")
 async def root():
     return {
@@ -47,5 +87,9 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/indexes")
+async def index_status():
+    return await index_manager.report()
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1 @@
+# This file makes the migrations directory a Python package
@@ -0,0 +1,254 @@
+"""
+Migration: move extracted text out of document records and compress it
+
+1. Page records in `document_pages` still holding plain `text` are rewritten
+   in compressed form (see app.services.text_store).
+2. Documents uploaded before per-page storage keep their full text inline in
+   `processed_text`. If the file is still on disk, its real pages (slides,
+   DOCX sections) are re-extracted and stored in `document_pages` under the
+   document's content hash, like a new upload. If the file is gone, the text
+   is stored as sections of about DOCX_SECTION_CHARS with `section_count`
+   instead of `page_count`: they don't correspond to pages, so the text is
+   served as a single page and page previews use the file's own page count.
+   Either way the inline text is removed from the record. Documents without a
+   content hash get one from their file (which is adopted into the blob
+   store, deduplicated against existing blobs) or, if the file is gone, from
+   the text itself.
+3. PDFs migrated by earlier versions of this script got 3000-character
+   sections stored as pages. Where the file's page count differs from the
+   stored one, its pages are re-extracted.
+
+Safe to re-run; each step only touches records still in the old layout.
+Prints collection sizes before and after.
+
+Usage (from backend/):
+    python -m migrations.compress_document_text --dry-run
+    python -m migrations.compress_document_text
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+from datetime import datetime
+from pymongo import DESCENDING, ReturnDocument, UpdateOne
+from app.models.database import database, documents_collection
+from app.services.blob_store import blobs_collection
+from app.services.text_store import (
+    text_store, pages_collection, encode_page_text, TEXT_COMPRESS_MIN_CHARS
+)
+from nlp_modules.text_extractor import DOCX_SECTION_CHARS, extract_pages, count_pdf_pages
+
+BATCH_SIZE = 500
+
+
+def split_sections(text: str) -> list:
+    """Split text into sections of about DOCX_SECTION_CHARS, at line breaks where possible"""
+    sections = []
+    start = 0
+    while start < len(text):
+        end = start + DOCX_SECTION_CHARS
+        if end < len(text):
+            newline = text.rfind("\n", start + DOCX_SECTION_CHARS // 2, end)
+            if newline != -1:
+                end = newline + 1
+        sections.append(text[start:end])
+        start = end
+    return sections
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1048576), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def collection_sizes() -> dict:
+    """Data size, on-disk size and average record size per collection (MongoDB collStats)"""
+    sizes = {}
+    for name in ("documents", "document_pages"):
+        stats = await database.command("collStats", name)
+        sizes[name] = (stats.get("size", 0), stats.get("storageSize", 0), stats.get("avgObjSize", 0))
+    return sizes
+
+
+def print_sizes(label: str, sizes: dict):
+    print(label)
+    for name, (size, storage, average) in sizes.items():
+        print(f"  {name:15} data {size / 1048576:8.1f}MB  on disk {storage / 1048576:8.1f}MB  avg record {average / 1024:7.1f}KB")
+
+
+async def compress_pages(dry_run: bool) -> int:
+    """Rewrite plain-text page records long enough to be stored compressed"""
+    converted = 0
+    requests = []
+    async for page in pages_collection.find({"text": {"$exists": True}}, {"text": 1}):
+        if len(page["text"]) < TEXT_COMPRESS_MIN_CHARS:
+            continue
+        converted += 1
+        if dry_run:
+            continue
+        requests.append(UpdateOne(
+            {"_id": page["_id"]},
+            {"$set": encode_page_text(page["text"]), "$unset": {"text": ""}}
+        ))
+        if len(requests) >= BATCH_SIZE:
+            await pages_collection.bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        await pages_collection.bulk_write(requests, ordered=False)
+    return converted
+
+
+async def adopt_file(document: dict, content_hash: str) -> str:
+    """Take a blob reference for a legacy document's file; returns the file path to keep"""
+    file_path = document["file_path"]
+    blob = await blobs_collection.find_one_and_update(
+        {"_id": content_hash},
+        {
+            "$inc": {"refcount": 1},
+            "$setOnInsert": {
+                "path": file_path,
+                "file_type": document.get("file_type"),
+                "size": os.path.getsize(file_path),
+                "created_at": datetime.utcnow(),
+            },
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob["path"] != file_path and os.path.exists(blob["path"]):
+        os.remove(file_path)  # Same bytes are already stored
+        return blob["path"]
+    return file_path
+
+
+async def extract_file_pages(document: dict, file_path: str):
+    """Real pages of a legacy document's file, or None if it can't be read"""
+    if not file_path or not os.path.exists(file_path) or not document.get("file_type"):
+        return None
+    try:
+        return await asyncio.to_thread(extract_pages, file_path, document["file_type"])
+    except Exception as e:
+        print(f"⚠️ Could not re-extract {file_path}: {str(e)}")
+        return None
+
+
+async def stored_layout(content_hash: str):
+    """Layout of text already in the page store for content_hash, if any"""
+    last_page = await pages_collection.find_one(
+        {"content_hash": content_hash}, {"page": 1, "end": 1}, sort=[("page", DESCENDING)]
+    )
+    if not last_page:
+        return None
+    paged = await documents_collection.find_one(
+        {"content_hash": content_hash, "page_count": {"$type": "number"}}, {"page_count": 1}
+    )
+    if paged:
+        return {"page_count": last_page["page"], "text_length": last_page["end"]}
+    return {"section_count": last_page["page"], "text_length": last_page["end"]}
+
+
+async def move_inline_text(dry_run: bool) -> int:
+    """Move `processed_text` of legacy documents into the page store"""
+    moved = 0
+    query = {"processed_text": {"$type": "string"}}
+    async for document in documents_collection.find(query):
+        text = document.get("processed_text")
+        if not isinstance(text, str):
+            continue  # Already migrated while the cursor was open
+        moved += 1
+        if dry_run:
+            continue
+
+        fields = {}
+        file_path = document.get("file_path")
+        content_hash = document.get("content_hash")
+        if not content_hash:
+            if file_path and os.path.exists(file_path):
+                content_hash = await asyncio.to_thread(file_sha256, file_path)
+                file_path = fields["file_path"] = await adopt_file(document, content_hash)
+            else:
+                content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            fields["content_hash"] = content_hash
+
+        # Identical content may already be stored by a newer upload
+        layout = await stored_layout(content_hash)
+        if layout is None:
+            pages = await extract_file_pages(document, file_path)
+            if pages is not None:
+                layout = await text_store.save_pages(content_hash, pages)
+            else:
+                # File gone: keep the text, but as sections rather than pages
+                sections = await text_store.save_pages(content_hash, split_sections(text))
+                layout = {"section_count": sections["page_count"], "text_length": sections["text_length"]}
+
+        await documents_collection.update_one(
+            {"_id": document["_id"]},
+            {"$set": {**fields, **layout}, "$unset": {"processed_text": ""}}
+        )
+    return moved
+
+
+async def repair_pdf_page_counts(dry_run: bool) -> int:
+    """Re-extract PDFs whose stored page count doesn't match the file (sections stored as pages)"""
+    repaired = 0
+    seen = set()
+    query = {"file_type": "pdf", "page_count": {"$type": "number"}, "content_hash": {"$exists": True}}
+    async for document in documents_collection.find(query, {"file_path": 1, "file_type": 1, "page_count": 1, "content_hash": 1}):
+        content_hash = document["content_hash"]
+        file_path = document.get("file_path")
+        if content_hash in seen or not file_path or not os.path.exists(file_path):
+            continue
+        seen.add(content_hash)
+        try:
+            real_count = await asyncio.to_thread(count_pdf_pages, file_path)
+        except Exception as e:
+            print(f"⚠️ Could not read {file_path}: {str(e)}")
+            continue
+        if real_count == document["page_count"]:
+            continue
+        repaired += 1
+        if dry_run:
+            continue
+
+        pages = await extract_file_pages(document, file_path)
+        if pages is None:
+            continue
+        await text_store.delete(content_hash)  # Drop sections beyond the real last page
+        layout = await text_store.save_pages(content_hash, pages)
+        await documents_collection.update_many({"content_hash": content_hash}, {"$set": layout})
+        await blobs_collection.update_one({"_id": content_hash, "page_count": {"$exists": True}}, {"$set": layout})
+    return repaired
+
+
+async def migrate(dry_run: bool):
+    try:
+        print_sizes("Before:", await collection_sizes())
+    except Exception as e:
+        print(f"⚠️ Could not read collection sizes: {str(e)}")
+
+    pages = await compress_pages(dry_run)
+    documents = await move_inline_text(dry_run)
+    repaired = await repair_pdf_page_counts(dry_run)
+    action = "Would migrate" if dry_run else "Migrated"
+    print(f"✅ {action} {pages} page records and {documents} documents with inline text")
+    print(f"✅ {'Would re-extract' if dry_run else 'Re-extracted'} {repaired} PDFs stored with sections as pages")
+
+    if not dry_run:
+        try:
+            print_sizes("After (on-disk size shrinks once MongoDB compacts or reuses the freed space):", await collection_sizes())
+        except Exception as e:
+            print(f"⚠️ Could not read collection sizes: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the records that would change")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Maintenance: recompute the stored document_count of every folder
+
+Counts documents per folder with one aggregation and rewrites the folder
+counters that differ. Run it once after setting FOLDER_DOCUMENT_COUNTERS=true
+(folders without a counter are counted by aggregation until then) and again
+whenever counters may have drifted. Safe to run while the API is serving.
+
+Usage (from backend/):
+    python -m migrations.repair_folder_counts
+    python -m migrations.repair_folder_counts --user <user id>
+"""
+import argparse
+import asyncio
+from app.services.folder_counts import folder_counter
+
+
+async def repair(user_id: str = None):
+    changed = await folder_counter.repair(user_id)
+    print(f"✅ Corrected document_count on {changed} folders")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="Only repair this user's folders")
+    args = parser.parse_args()
+    asyncio.run(repair(args.user))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,25 @@
 import os
 import google.generativeai as genai
-from groq import Groq
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+import httpx
 from dotenv import load_dotenv
 import asyncio
+import json
+import re
+import time
 from functools import wraps
+from nlp_modules.llm_cache import llm_cache, make_cache_key
+from nlp_modules.provider_router import provider_router
+from nlp_modules.scheduler import llm_scheduler, QueueTimeout, INTERACTIVE, BACKGROUND
+from nlp_modules.single_flight import single_flight, make_request_fingerprint
+from nlp_modules.preprocessor import tokenize_sentences
+from nlp_modules.token_budget import (
+    estimate_tokens,
+    chars_for_tokens,
+    input_budget,
+    fit_to_budget,
+    completion_budget,
+)
 
 load_dotenv()
 
@@ -11,103 +27,554 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# Model names (part of the response cache key)
+GEMINI_MODEL = 'models/gemini-2.5-flash'
+GROQ_MODEL = "llama-3.3-70b-versatile"  # Fast and capable model
+
+# Bump whenever the prompt templates below change so stale cached responses are not reused
+PROMPT_TEMPLATE_VERSION = "2"
+
+# Per-attempt timeout, and how long a request may wait when every provider's circuit is open
+LLM_PROVIDER_TIMEOUT_SECONDS = float(os.getenv("LLM_PROVIDER_TIMEOUT_SECONDS", 30))
+LLM_MAX_BACKOFF_WAIT_SECONDS = float(os.getenv("LLM_MAX_BACKOFF_WAIT_SECONDS", 5))
+
+# Per-provider concurrency and quota (0 disables a rate limit). Defaults match the free tiers.
+llm_scheduler.configure(
+    "gemini",
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", 8)),
+    rpm=float(os.getenv("GEMINI_RPM", 10)),
+    tpm=float(os.getenv("GEMINI_TPM", 250000)),
+)
+llm_scheduler.configure(
+    "groq",
+    max_concurrency=int(os.getenv("GROQ_MAX_CONCURRENCY", 8)),
+    rpm=float(os.getenv("GROQ_RPM", 30)),
+    tpm=float(os.getenv("GROQ_TPM", 12000)),
+)
+
+# Shared connection pool for the Groq async client
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 200))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", 50))
+
+# Hedged requests: if the primary provider is slower than its usual tail latency,
+# race the same prompt on the next provider and keep whichever answers first
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0.95))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", 1.0))
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", 4.0))
+LLM_HEDGE_MIN_SAMPLES = 10
+
+# Hierarchical (map-reduce) summarization of documents larger than a single prompt
+MAP_REDUCE_ENABLED = os.getenv("MAP_REDUCE_ENABLED", "true").lower() == "true"
+MAP_REDUCE_CHUNK_TOKENS = int(os.getenv("MAP_REDUCE_CHUNK_TOKENS", 2000))
+MAP_REDUCE_FANOUT = int(os.getenv("MAP_REDUCE_FANOUT", 4))
+MAP_REDUCE_MAX_DEPTH = 5
+
+# Input token budgets per prompt type (clamped to the smallest configured context window).
+# Larger budgets use more of the models' context but also more of the per-minute token quota.
+SUMMARY_INPUT_TOKENS = int(os.getenv("LLM_SUMMARY_INPUT_TOKENS", 6000))
+STUDY_NOTES_INPUT_TOKENS = int(os.getenv("LLM_STUDY_NOTES_INPUT_TOKENS", 6000))
+EXPLANATION_INPUT_TOKENS = int(os.getenv("LLM_EXPLANATION_INPUT_TOKENS", 1000))
+
 # Initialize clients
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
-    gemini_model = genai.GenerativeModel('models/gemini-2.5-flash')
+    gemini_model = genai.GenerativeModel(GEMINI_MODEL)
 else:
     gemini_model = None
 
+# Both clients are native asyncio: an in-flight generation costs a coroutine and a
+# pooled connection (gRPC channel for Gemini, httpx pool for Groq), not an executor thread
 if GROQ_API_KEY:
-    groq_client = Groq(api_key=GROQ_API_KEY)
+    groq_client = AsyncGroq(
+        api_key=GROQ_API_KEY,
+        # Retries and back-off are handled by the provider router
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(LLM_PROVIDER_TIMEOUT_SECONDS, connect=10.0),
+        ),
+    )
 else:
     groq_client = None
 
 
-async def generate_with_fallback(prompt: str, max_tokens: int = 1024, temperature: float = 0.7) -> str:
+async def _generate_with_gemini(prompt: str, max_tokens: int, temperature: float) -> str:
+    """Single completion request against Gemini"""
+    response = await gemini_model.generate_content_async(
+        prompt,
+        generation_config=genai.types.GenerationConfig(
+            max_output_tokens=max_tokens,
+            temperature=temperature,
+        )
+    )
+    
+    # Handle the response properly for new API version
+    if response and response.candidates:
+        # Get text from the first candidate's content parts
+        text_parts = []
+        for part in response.candidates[0].content.parts:
+            if hasattr(part, 'text'):
+                text_parts.append(part.text)
+        
+        if text_parts:
+            return ''.join(text_parts)
+        raise Exception("No text content in response")
+    raise Exception("Empty response from Gemini")
+
+
+async def _generate_with_groq(prompt: str, max_tokens: int, temperature: float) -> str:
+    """Single completion request against Groq"""
+    chat_completion = await groq_client.chat.completions.create(
+        messages=[
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        ],
+        model=GROQ_MODEL,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+    
+    return chat_completion.choices[0].message.content
+
+
+async def _stream_with_gemini(prompt: str, max_tokens: int, temperature: float):
+    """Streaming completion against Gemini, yields text deltas"""
+    response = await gemini_model.generate_content_async(
+        prompt,
+        generation_config=genai.types.GenerationConfig(
+            max_output_tokens=max_tokens,
+            temperature=temperature,
+        ),
+        stream=True
+    )
+    
+    async for chunk in response:
+        if not chunk.candidates:
+            continue
+        for part in chunk.candidates[0].content.parts:
+            if getattr(part, 'text', None):
+                yield part.text
+
+
+async def _stream_with_groq(prompt: str, max_tokens: int, temperature: float):
+    """Streaming completion against Groq, yields text deltas"""
+    stream = await groq_client.chat.completions.create(
+        messages=[
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        ],
+        model=GROQ_MODEL,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True,
+    )
+    
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _configured_providers(streaming: bool = False) -> list:
+    """Providers in fallback order as (name, model, generate function)"""
+    providers = []
+    if gemini_model:
+        providers.append(("gemini", GEMINI_MODEL, _stream_with_gemini if streaming else _generate_with_gemini))
+    if groq_client:
+        providers.append(("groq", GROQ_MODEL, _stream_with_groq if streaming else _generate_with_groq))
+    return providers
+
+
+async def _wait_for_available_provider(providers: list):
+    """If every provider is cooling down, wait briefly for the first one to reopen or give up"""
+    wait = provider_router.seconds_until_available([name for name, _, _ in providers])
+    if wait <= 0:
+        return
+    if wait > LLM_MAX_BACKOFF_WAIT_SECONDS:
+        raise Exception(f"All LLM providers are temporarily unavailable. Retry in {wait:.0f}s")
+    print(f"⏳ All LLM providers cooling down, waiting {wait:.1f}s")
+    await asyncio.sleep(wait)
+
+
+def _estimate_request_tokens(name: str, prompt: str, max_tokens: int) -> int:
+    """Prompt + completion size, used for tokens-per-minute accounting"""
+    return estimate_tokens(prompt, [name]) + max_tokens
+
+
+async def _call_provider(
+    name: str,
+    generate,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    priority: int = INTERACTIVE
+) -> str:
+    """Run one provider attempt in a scheduler slot with a timeout, recording its outcome in the provider router"""
+    try:
+        async with llm_scheduler.slot(name, priority, _estimate_request_tokens(name, prompt, max_tokens)):
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    generate(prompt, max_tokens, temperature),
+                    timeout=LLM_PROVIDER_TIMEOUT_SECONDS
+                )
+            except asyncio.CancelledError:
+                provider_router.record_cancelled(name, time.monotonic() - started)
+                raise
+            except asyncio.TimeoutError:
+                error = Exception(f"{name} API timed out after {LLM_PROVIDER_TIMEOUT_SECONDS:.0f}s")
+                provider_router.record_failure(name, time.monotonic() - started, error)
+                raise error
+            except Exception as e:
+                provider_router.record_failure(name, time.monotonic() - started, e)
+                raise
+    except (QueueTimeout, asyncio.CancelledError):
+        # Never reached (or abandoned) the provider: not a health signal
+        provider_router.release(name)
+        raise
+    
+    provider_router.record_success(name, time.monotonic() - started)
+    return result
+
+
+def _hedge_delay(name: str) -> float:
+    """How long to give a provider before hedging, from its observed latency distribution"""
+    health = provider_router.health(name)
+    latency = health.latency_percentile(LLM_HEDGE_PERCENTILE)
+    if latency is None or len(health.samples) < LLM_HEDGE_MIN_SAMPLES:
+        return LLM_HEDGE_DEFAULT_DELAY_SECONDS
+    return max(LLM_HEDGE_MIN_DELAY_SECONDS, latency)
+
+
+async def _run_providers(
+    providers: list,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    priority: int = INTERACTIVE
+) -> tuple:
+    """
+    Try providers in fallback order and return (name, model, text) of the first success.
+    
+    Without hedging this is a plain sequential fallback. With hedging enabled, a
+    second provider is started when the first has not answered within its hedge
+    delay; the first successful answer wins and the other attempt is cancelled.
+    """
+    queue = list(providers)
+    running = {}  # task -> (name, model)
+    primary_name = None  # Provider of the attempt a hedge would race against
+    hedge_task = None
+    hedged = False
+    last_error = None
+    
+    def launch_next() -> bool:
+        while queue:
+            name, model, generate = queue.pop(0)
+            if not provider_router.try_acquire(name):
+                print(f"⏭️ Skipping {name} API (circuit open)")
+                continue
+            print(f"🔵 Attempting with {name} API...")
+            task = asyncio.create_task(_call_provider(name, generate, prompt, max_tokens, temperature, priority))
+            running[task] = (name, model)
+            return True
+        return False
+    
+    try:
+        if launch_next():
+            primary_name = next(iter(running.values()))[0]
+        
+        while running:
+            timeout = None
+            if LLM_HEDGE_ENABLED and not hedged and queue and len(running) == 1:
+                timeout = _hedge_delay(primary_name)
+            
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            
+            if not done:
+                # Primary is slower than usual: race the next provider against it
+                hedged = True
+                if launch_next():
+                    hedge_task = list(running)[-1]
+                    provider_router.record_hedge("fired")
+                    print(f"🏁 Hedging slow {primary_name} request")
+                continue
+            
+            for task in done:
+                name, model = running.pop(task)
+                if task.exception() is None:
+                    print(f"✅ {name} API successful")
+                    if hedge_task is not None:
+                        provider_router.record_hedge("won" if task is hedge_task else "lost")
+                    return name, model, task.result()
+                last_error = task.exception()
+                print(f"⚠️ {name} API failed: {str(last_error)}")
+            
+            if not running and launch_next():
+                # Sequential fallback: the new attempt is the one a hedge would race
+                primary_name = next(iter(running.values()))[0]
+    finally:
+        for task in running:
+            task.cancel()
+    
+    if last_error is None:
+        raise Exception("All LLM providers are temporarily unavailable")
+    raise Exception(f"All configured LLM APIs failed. Last error: {str(last_error)}")
+
+
+async def generate_with_fallback(
+    prompt: str,
+    max_tokens: int = 1024,
+    temperature: float = 0.7,
+    use_cache: bool = True,
+    priority: int = INTERACTIVE
+) -> str:
     """
     Generate text using Gemini API with automatic fallback to Groq if Gemini fails.
     
+    Responses are served from the LLM response cache when the same request
+    was answered before. Providers whose circuit breaker is open are skipped
+    without waiting for them to fail, and with LLM_HEDGE_ENABLED a slow
+    primary is raced against the next provider. Concurrent identical requests
+    are coalesced into one provider call.
+    
     Args:
         prompt: The input prompt
         max_tokens: Maximum tokens to generate
         temperature: Sampling temperature (0.0 to 1.0)
+        use_cache: Look up and store the response in the LLM response cache
+        priority: Scheduler priority class (INTERACTIVE or BACKGROUND)
     
     Returns:
         Generated text
     """
+    providers = _configured_providers()
+    if not providers:
+        raise Exception("No API keys configured. Please set GEMINI_API_KEY or GROQ_API_KEY in .env file")
     
-    # Try Gemini first
-    if gemini_model:
-        try:
-            print("🔵 Attempting with Gemini API...")
-            response = await asyncio.to_thread(
-                gemini_model.generate_content,
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=max_tokens,
-                    temperature=temperature,
-                )
-            )
-            
-            # Handle the response properly for new API version
-            if response and response.candidates:
-                # Get text from the first candidate's content parts
-                text_parts = []
-                for part in response.candidates[0].content.parts:
-                    if hasattr(part, 'text'):
-                        text_parts.append(part.text)
-                
-                if text_parts:
-                    result = ''.join(text_parts)
-                    print("✅ Gemini API successful")
-                    return result
-                else:
-                    raise Exception("No text content in response")
-            else:
-                raise Exception("Empty response from Gemini")
-                
-        except Exception as e:
-            print(f"⚠️ Gemini API failed: {str(e)}")
-            print("🔄 Falling back to Groq API...")
+    cache_keys = {
+        name: make_cache_key(prompt, name, model, temperature, max_tokens, PROMPT_TEMPLATE_VERSION)
+        for name, model, _ in providers
+    }
     
-    # Fallback to Groq
-    if groq_client:
+    # Any provider's cached answer is good enough, checked in fallback order
+    if use_cache:
+        for name, _, _ in providers:
+            cached = await llm_cache.get(cache_keys[name])
+            if cached is not None:
+                print(f"⚡ LLM cache hit ({name})")
+                return cached
+    
+    async def generate() -> str:
+        await _wait_for_available_provider(providers)
+        
+        name, model, result = await _run_providers(providers, prompt, max_tokens, temperature, priority)
+        
+        if use_cache:
+            await llm_cache.set(cache_keys[name], result, provider=name, model=model)
+        return result
+    
+    # Identical concurrent requests share a single provider call
+    fingerprint = make_request_fingerprint(prompt, max_tokens, temperature, PROMPT_TEMPLATE_VERSION)
+    return await single_flight.run(fingerprint, generate)
+
+
+async def stream_with_fallback(
+    prompt: str,
+    max_tokens: int = 1024,
+    temperature: float = 0.7,
+    use_cache: bool = True,
+    priority: int = INTERACTIVE
+):
+    """
+    Stream generated text as it arrives, with the same provider fallback as generate_with_fallback.
+    
+    Falling back to the next provider is only possible until the first delta
+    has been yielded; a failure after that is raised to the caller.
+    
+    Args:
+        prompt: The input prompt
+        max_tokens: Maximum tokens to generate
+        temperature: Sampling temperature (0.0 to 1.0)
+        use_cache: Serve from / store into the LLM response cache
+        priority: Scheduler priority class (INTERACTIVE or BACKGROUND)
+    
+    Yields:
+        Text deltas
+    """
+    providers = _configured_providers(streaming=True)
+    if not providers:
+        raise Exception("No API keys configured. Please set GEMINI_API_KEY or GROQ_API_KEY in .env file")
+    
+    cache_keys = {
+        name: make_cache_key(prompt, name, model, temperature, max_tokens, PROMPT_TEMPLATE_VERSION)
+        for name, model, _ in providers
+    }
+    
+    if use_cache:
+        for name, _, _ in providers:
+            cached = await llm_cache.get(cache_keys[name])
+            if cached is not None:
+                print(f"⚡ LLM cache hit ({name})")
+                yield cached
+                return
+    
+    await _wait_for_available_provider(providers)
+    
+    last_error = None
+    for name, model, stream in providers:
+        if not provider_router.try_acquire(name):
+            print(f"⏭️ Skipping {name} API (circuit open)")
+            continue
+        parts = []
+        started = time.monotonic()
         try:
-            print("🟢 Attempting with Groq API...")
-            chat_completion = await asyncio.to_thread(
-                groq_client.chat.completions.create,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model="llama-3.3-70b-versatile",  # Fast and capable model
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-            
-            result = chat_completion.choices[0].message.content
-            print("✅ Groq API successful")
-            return result
-            
+            async with llm_scheduler.slot(name, priority, _estimate_request_tokens(name, prompt, max_tokens)):
+                started = time.monotonic()
+                print(f"🔵 Streaming with {name} API...")
+                async for delta in stream(prompt, max_tokens, temperature):
+                    parts.append(delta)
+                    yield delta
+            print(f"✅ {name} API stream complete")
         except Exception as e:
-            print(f"❌ Groq API also failed: {str(e)}")
-            raise Exception(f"Both Gemini and Groq APIs failed. Last error: {str(e)}")
+            if not isinstance(e, QueueTimeout):
+                provider_router.record_failure(name, time.monotonic() - started, e)
+            if parts:
+                # Tokens already reached the client, a different provider cannot continue them
+                raise
+            last_error = e
+            print(f"⚠️ {name} API failed: {str(e)}")
+            continue
+        finally:
+            # Client went away mid-stream: free a half-open probe slot
+            provider_router.release(name)
+        
+        provider_router.record_success(name, time.monotonic() - started)
+        
+        if use_cache:
+            await llm_cache.set(cache_keys[name], ''.join(parts), provider=name, model=model)
+        return
     
-    raise Exception("No API keys configured. Please set GEMINI_API_KEY or GROQ_API_KEY in .env file")
+    if last_error is None:
+        raise Exception("All LLM providers are temporarily unavailable")
+    raise Exception(f"All configured LLM APIs failed. Last error: {str(last_error)}")
 
 
-async def generate_summary_with_api(text: str, summary_type: str = "extractive") -> str:
-    """Generate summary using API"""
+def _provider_names() -> list:
+    return [name for name, _, _ in _configured_providers()]
+
+
+def _fit_input(text: str, budget_tokens: int, max_output_tokens: int) -> str:
+    """Trim text at a sentence boundary to the input budget every configured provider can take"""
+    providers = _provider_names()
+    return fit_to_budget(text, input_budget(budget_tokens, max_output_tokens, providers), providers)
+
+
+def _input_tokens(text: str) -> int:
+    return estimate_tokens(text, _provider_names())
+
+
+def _split_into_chunks(text: str, max_chars: int) -> list:
+    """Pack whole sentences into chunks of at most max_chars characters"""
+    chunks = []
+    current = []
+    current_len = 0
+    
+    for sentence in tokenize_sentences(text):
+        # Hard-split pathological "sentences" (tables, OCR noise) that exceed a chunk
+        pieces = [sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars)] or [sentence]
+        for piece in pieces:
+            if current and current_len + len(piece) + 1 > max_chars:
+                chunks.append(' '.join(current))
+                current = []
+                current_len = 0
+            current.append(piece)
+            current_len += len(piece) + 1
+    
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def _chunk_notes_request(chunk: str, priority: int = BACKGROUND) -> dict:
+    """Build the map-step request that condenses one section of a long document"""
+    
+    max_tokens = completion_budget(_input_tokens(chunk), ratio=0.3, floor=150, cap=600)
+    
+    prompt = f"""The following text is one section of a longer document.
+Write condensed notes for this section only. Preserve the main ideas, definitions,
+important facts and figures, formulas and relationships. Do not add an introduction
+or conclusion. Be concise.
+
+Section:
+{chunk}
+
+Condensed notes:"""
+    
+    return {"prompt": prompt, "max_tokens": max_tokens, "temperature": 0.2, "priority": priority}
+
+
+async def condense_document(text: str, budget_tokens: int, priority: int = BACKGROUND) -> str:
+    """
+    Reduce a document to at most budget_tokens tokens with map-reduce summarization.
+    
+    Text that already fits is returned unchanged. Otherwise the text is split into
+    token-sized chunks that are condensed concurrently (at most MAP_REDUCE_FANOUT
+    at a time), and the joined notes are condensed again until they fit.
+    Chunk notes go through the LLM response cache, so regenerating a summary for
+    the same document only pays for the final reduce call.
+    
+    Args:
+        text: Full document text
+        budget_tokens: Size (in estimated tokens) the result has to fit in
+        priority: Scheduler priority of the chunk requests; INTERACTIVE when a user
+            is waiting on the result (summaries), BACKGROUND for bulk work
+    
+    Returns:
+        Text of at most budget_tokens tokens
+    """
+    providers = _provider_names()
+    if not MAP_REDUCE_ENABLED:
+        return fit_to_budget(text, budget_tokens, providers)
+    
+    chunk_chars = chars_for_tokens(MAP_REDUCE_CHUNK_TOKENS, providers)
+    semaphore = asyncio.Semaphore(MAP_REDUCE_FANOUT)
+    
+    async def condense_chunk(chunk: str) -> str:
+        async with semaphore:
+            notes = await generate_with_fallback(**_chunk_notes_request(chunk, priority))
+            return notes.strip()
+    
+    for depth in range(MAP_REDUCE_MAX_DEPTH):
+        if estimate_tokens(text, providers) <= budget_tokens:
+            return text
+        
+        chunks = _split_into_chunks(text, chunk_chars)
+        print(f"🧩 Map-reduce level {depth + 1}: condensing {len(chunks)} chunks")
+        notes = await asyncio.gather(*(condense_chunk(chunk) for chunk in chunks))
+        text = '\n\n'.join(notes)
+    
+    return fit_to_budget(text, budget_tokens, providers)
+
+
+def _summary_request(text: str, summary_type: str = "extractive") -> dict:
+    """Build the generation request for a summary"""
+    text = _fit_input(text, SUMMARY_INPUT_TOKENS, 500)
+    # Short inputs get short (and fast) completions
+    max_tokens = completion_budget(_input_tokens(text), ratio=0.25, floor=150, cap=500)
     
     if summary_type == "extractive":
         prompt = f"""Extract the most important sentences from this text to create a concise summary. 
 Keep the original wording and select 3-5 key sentences that capture the main points.
 
 Text:
-{text[:4000]}  # Limit text length
+{text}
 
 Summary:"""
     else:  # abstractive
@@ -116,15 +583,30 @@ Rewrite the main ideas in your own words, making it clear and easy to understand
 Aim for 3-4 sentences.
 
 Text:
-{text[:4000]}  # Limit text length
+{text}
 
 Summary:"""
     
-    return await generate_with_fallback(prompt, max_tokens=500, temperature=0.5)
+    return {"prompt": prompt, "max_tokens": max_tokens, "temperature": 0.5}
 
 
-async def generate_explanation_with_api(text: str, tone: str = "simple") -> str:
-    """Generate explanation using API"""
+async def generate_summary_with_api(text: str, summary_type: str = "extractive") -> str:
+    """Generate summary using API"""
+    text = await condense_document(text, SUMMARY_INPUT_TOKENS, INTERACTIVE)
+    return await generate_with_fallback(**_summary_request(text, summary_type))
+
+
+async def stream_summary_with_api(text: str, summary_type: str = "extractive"):
+    """Stream a summary from the API as text deltas"""
+    text = await condense_document(text, SUMMARY_INPUT_TOKENS, INTERACTIVE)
+    async for delta in stream_with_fallback(**_summary_request(text, summary_type)):
+        yield delta
+
+
+def _explanation_request(text: str, tone: str = "simple") -> dict:
+    """Build the generation request for an explanation"""
+    text = _fit_input(text, EXPLANATION_INPUT_TOKENS, 800)
+    max_tokens = completion_budget(_input_tokens(text), ratio=2.0, floor=200, cap=800)
     
     tone_prompts = {
         "simple": "Explain this in simple, easy-to-understand terms:",
@@ -136,15 +618,27 @@ async def generate_explanation_with_api(text: str, tone: str = "simple") -> str:
     prompt = f"""{tone_prompts.get(tone, tone_prompts["simple"])}
 
 Text:
-{text[:2000]}  # Limit text length
+{text}
 
 Explanation:"""
     
-    return await generate_with_fallback(prompt, max_tokens=800, temperature=0.7)
+    return {"prompt": prompt, "max_tokens": max_tokens, "temperature": 0.7}
 
 
-async def generate_key_points_with_api(text: str) -> str:
-    """Generate exam-ready key points from document"""
+async def generate_explanation_with_api(text: str, tone: str = "simple") -> str:
+    """Generate explanation using API"""
+    return await generate_with_fallback(**_explanation_request(text, tone))
+
+
+def stream_explanation_with_api(text: str, tone: str = "simple"):
+    """Stream an explanation from the API as text deltas"""
+    return stream_with_fallback(**_explanation_request(text, tone))
+
+
+def _key_points_request(text: str) -> dict:
+    """Build the generation request for exam key points"""
+    text = _fit_input(text, STUDY_NOTES_INPUT_TOKENS, 1000)
+    max_tokens = completion_budget(_input_tokens(text), ratio=0.4, floor=300, cap=1000)
     
     prompt = f"""Analyze the following document and extract the most important key points for exam preparation.
 Format your response as a numbered list of concise bullet points.
@@ -158,15 +652,30 @@ Focus on:
 Aim for 8-12 key points that a student should memorize for an exam.
 
 Document:
-{text[:6000]}  # Larger limit for comprehensive analysis
+{text}
 
 KEY POINTS:"""
     
-    return await generate_with_fallback(prompt, max_tokens=1000, temperature=0.3)
+    return {"prompt": prompt, "max_tokens": max_tokens, "temperature": 0.3, "priority": BACKGROUND}
 
 
-async def generate_short_notes_with_api(text: str) -> str:
-    """Generate exam-ready short notes from document"""
+async def generate_key_points_with_api(text: str) -> str:
+    """Generate exam-ready key points from document"""
+    text = await condense_document(text, STUDY_NOTES_INPUT_TOKENS)
+    return await generate_with_fallback(**_key_points_request(text))
+
+
+async def stream_key_points_with_api(text: str):
+    """Stream exam-ready key points as text deltas"""
+    text = await condense_document(text, STUDY_NOTES_INPUT_TOKENS)
+    async for delta in stream_with_fallback(**_key_points_request(text)):
+        yield delta
+
+
+def _short_notes_request(text: str) -> dict:
+    """Build the generation request for exam short notes"""
+    text = _fit_input(text, STUDY_NOTES_INPUT_TOKENS, 1500)
+    max_tokens = completion_budget(_input_tokens(text), ratio=0.5, floor=400, cap=1500)
     
     prompt = f"""Create concise, exam-ready short notes from the following document.
 Structure your notes with:
@@ -178,9 +687,95 @@ Structure your notes with:
 Make it easy to review quickly before an exam. Use clear formatting with bullet points and short paragraphs.
 
 Document:
-{text[:6000]}  # Larger limit for comprehensive notes
+{text}
 
 EXAM NOTES:"""
     
-    return await generate_with_fallback(prompt, max_tokens=1500, temperature=0.4)
+    return {"prompt": prompt, "max_tokens": max_tokens, "temperature": 0.4, "priority": BACKGROUND}
+
+
+async def generate_short_notes_with_api(text: str) -> str:
+    """Generate exam-ready short notes from document"""
+    text = await condense_document(text, STUDY_NOTES_INPUT_TOKENS)
+    return await generate_with_fallback(**_short_notes_request(text))
+
+
+async def stream_short_notes_with_api(text: str):
+    """Stream exam-ready short notes as text deltas"""
+    text = await condense_document(text, STUDY_NOTES_INPUT_TOKENS)
+    async for delta in stream_with_fallback(**_short_notes_request(text)):
+        yield delta
+
+
+def _study_notes_request(text: str) -> dict:
+    """Build a single request that returns key points and short notes together as JSON"""
+    text = _fit_input(text, STUDY_NOTES_INPUT_TOKENS, 2500)
+    max_tokens = completion_budget(_input_tokens(text), ratio=0.9, floor=700, cap=2500)
+    
+    prompt = f"""Prepare exam study material from the following document.
+
+Return ONLY a JSON object with exactly two string fields:
+- "key_points": a numbered list of 8-12 concise key points a student should memorize
+  (main concepts and definitions, important facts and figures, key theories or frameworks,
+  critical relationships or processes, memorable formulas or equations if any)
+- "short_notes": concise exam-ready notes with a brief overview (2-3 sentences), key topics
+  with explanations under subheadings, important terms and definitions, and quick revision points
 
+Use markdown formatting inside the strings. Do not wrap the JSON in code fences.
+
+Document:
+{text}
+
+JSON:"""
+    
+    return {"prompt": prompt, "max_tokens": max_tokens, "temperature": 0.3, "priority": BACKGROUND}
+
+
+def _parse_study_notes(raw: str) -> dict:
+    """Parse the combined study notes response, raising ValueError if it is not the expected JSON"""
+    # Models sometimes wrap JSON in ```json fences despite being asked not to
+    cleaned = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", raw.strip())
+    data = json.loads(cleaned)
+    
+    notes = {}
+    for field in ("key_points", "short_notes"):
+        value = data.get(field) if isinstance(data, dict) else None
+        if isinstance(value, list):
+            value = "\n".join(str(item) for item in value)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"Missing '{field}' in study notes response")
+        notes[field] = value.strip()
+    return notes
+
+
+async def generate_study_notes_with_api(text: str, combined: bool = False) -> dict:
+    """
+    Generate exam key points and short notes for a document.
+    
+    Args:
+        text: Document text
+        combined: Ask for both in one structured (JSON) call instead of two concurrent calls
+    
+    Returns:
+        dict with 'key_points' and 'short_notes'
+    """
+    text = await condense_document(text, STUDY_NOTES_INPUT_TOKENS)
+    
+    if combined:
+        raw = await generate_with_fallback(**_study_notes_request(text))
+        try:
+            return _parse_study_notes(raw)
+        except ValueError as e:
+            print(f"⚠️ Combined study notes were not valid JSON, generating separately: {str(e)}")
+    
+    key_points_task = asyncio.create_task(generate_with_fallback(**_key_points_request(text)))
+    short_notes_task = asyncio.create_task(generate_with_fallback(**_short_notes_request(text)))
+    try:
+        key_points, short_notes = await asyncio.gather(key_points_task, short_notes_task)
+    except BaseException:
+        # One failed (or the request was cancelled): don't keep paying for the other
+        key_points_task.cancel()
+        short_notes_task.cancel()
+        raise
+    
+    return {"key_points": key_points, "short_notes": short_notes}
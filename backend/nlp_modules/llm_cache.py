@@ -0,0 +1,220 @@
+"""
+Content-addressed cache for LLM responses.
+
+Two tiers:
+- a bounded in-memory LRU for hot prompts
+- a persistent on-disk tier with TTL and size-based eviction
+
+Entries are keyed by a SHA-256 of everything that influences the completion
+(prompt, provider, model, temperature, max_tokens and prompt template version).
+"""
+import os
+import json
+import time
+import hashlib
+import asyncio
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "./cache/llm")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 104857600))  # 100MB
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 604800))  # 7 days
+
+# How many disk writes between two eviction sweeps of the cache directory
+EVICTION_SWEEP_INTERVAL = 50
+
+
+def make_cache_key(
+    prompt: str,
+    provider: str,
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    template_version: str
+) -> str:
+    """Build a content-addressed key for a single completion request"""
+    payload = json.dumps(
+        {
+            "prompt": prompt,
+            "provider": provider,
+            "model": model,
+            "temperature": round(float(temperature), 3),
+            "max_tokens": int(max_tokens),
+            "template_version": template_version,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier (memory LRU + disk) cache for generated text
+    """
+    def __init__(
+        self,
+        cache_dir: str = LLM_CACHE_DIR,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        enabled: bool = LLM_CACHE_ENABLED
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._memory = OrderedDict()  # key -> (expires_at, text)
+        self._writes_since_sweep = 0
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def _path_for(self, key: str) -> str:
+        # Shard by the first two hex chars to keep directories small
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, text: str, expires_at: float):
+        """Insert into the memory tier, evicting least recently used entries"""
+        self._memory[key] = (expires_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[dict]:
+        path = self._path_for(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("expires_at", 0) < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        # Touch the file so size-based eviction behaves like LRU
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def _write_disk(self, key: str, entry: dict):
+        path = self._path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        self._writes_since_sweep += 1
+        if self._writes_since_sweep >= EVICTION_SWEEP_INTERVAL:
+            self._writes_since_sweep = 0
+            self._sweep_disk()
+
+    def _sweep_disk(self):
+        """Drop expired entries, then the least recently used ones until under max_bytes"""
+        now = time.time()
+        files = []
+        total_bytes = 0
+
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                # mtime is refreshed on every hit, so it doubles as last access time
+                if stat.st_mtime + self.ttl_seconds < now:
+                    self._remove_file(path)
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total_bytes += stat.st_size
+
+        if total_bytes <= self.max_bytes:
+            return
+
+        files.sort()
+        for _, size, path in files:
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove_file(path)
+            total_bytes -= size
+
+    def _remove_file(self, path: str):
+        try:
+            os.remove(path)
+            self.stats["evictions"] += 1
+        except OSError:
+            pass
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return cached text for key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        cached = self._memory.get(key)
+        if cached:
+            expires_at, text = cached
+            if expires_at >= time.time():
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return text
+            del self._memory[key]
+
+        entry = await asyncio.to_thread(self._read_disk, key)
+        if entry:
+            self._remember(key, entry["text"], entry["expires_at"])
+            self.stats["disk_hits"] += 1
+            return entry["text"]
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, text: str, **metadata):
+        """Store text under key in both tiers"""
+        if not self.enabled or not text:
+            return
+
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, text, expires_at)
+        self.stats["stores"] += 1
+
+        entry = {"text": text, "expires_at": expires_at, "created_at": time.time()}
+        entry.update(metadata)
+        try:
+            await asyncio.to_thread(self._write_disk, key, entry)
+        except OSError as e:
+            print(f"⚠️ Could not persist LLM cache entry: {str(e)}")
+
+    def get_stats(self) -> dict:
+        """Hit/miss counters plus current memory tier size"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "enabled": self.enabled,
+        }
+
+
+# Create singleton instance
+llm_cache = LLMResponseCache()
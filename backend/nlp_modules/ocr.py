@@ -0,0 +1,125 @@
+"""
+Selective OCR for scanned PDF pages.
+
+Only pages whose text layer is empty or nearly empty are OCR'd. Those pages
+are rendered with PyMuPDF at OCR_DPI and passed to Tesseract (pytesseract) in
+the document process pool, a few pages per job. Results are cached on disk
+by a hash of the rendered page image, so the same scanned page is never
+recognised twice, even inside a different file.
+"""
+import io
+import os
+import shutil
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Optional
+import fitz  # PyMuPDF
+from nlp_modules.process_pool import document_pool, DocumentProcessPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_DPI = int(os.getenv("OCR_DPI", 200))
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", 25))  # Pages with less text than this are OCR'd
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "./cache/ocr")
+OCR_PAGES_PER_JOB = 4  # Keeps each pool job well inside the extraction timeout
+
+
+def find_scanned_pages(pages: list) -> list:
+    """1-based numbers of pages whose text layer is too thin to be real text"""
+    return [number for number, text in enumerate(pages, start=1) if len(text.strip()) < OCR_MIN_TEXT_CHARS]
+
+
+def ocr_available() -> bool:
+    """OCR is enabled and the Tesseract binary is installed"""
+    if not OCR_ENABLED:
+        return False
+    import pytesseract
+    return shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+
+
+def _cache_path(page_hash: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, page_hash[:2], f"{page_hash}.txt")
+
+
+def _read_cache(page_hash: str) -> Optional[str]:
+    try:
+        with open(_cache_path(page_hash), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_cache(page_hash: str, text: str):
+    path = _cache_path(page_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def ocr_pdf_pages(file_path: str, page_numbers: list, dpi: int, language: str) -> dict:
+    """
+    Render and OCR the given pages of a PDF (runs in a worker process).
+
+    Args:
+        file_path: PDF path
+        page_numbers: 1-based page numbers
+        dpi: Render resolution
+        language: Tesseract language code(s), e.g. 'eng' or 'eng+deu'
+
+    Returns:
+        dict of page number -> recognised text (pages without images are skipped)
+    """
+    import pytesseract
+    from PIL import Image
+
+    results = {}
+    with fitz.open(file_path) as doc:
+        for number in page_numbers:
+            page = doc[number - 1]
+            if not page.get_images():
+                continue  # Blank or vector-only page: nothing to recognise
+
+            pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            png = pixmap.tobytes("png")
+            page_hash = hashlib.sha256(f"{dpi}\x00{language}\x00".encode() + png).hexdigest()
+
+            text = _read_cache(page_hash)
+            if text is None:
+                text = pytesseract.image_to_string(Image.open(io.BytesIO(png)), lang=language)
+                _write_cache(page_hash, text)
+            results[number] = text
+    return results
+
+
+async def ocr_scanned_pages(
+    file_path: str,
+    page_numbers: list,
+    pool: DocumentProcessPool = document_pool,
+    on_progress: Optional[Callable[[], Awaitable]] = None,
+) -> dict:
+    """
+    OCR pages of a PDF in the process pool.
+
+    Args:
+        on_progress: awaited after each wave of jobs (e.g. to keep a lease alive)
+
+    Returns:
+        dict of page number -> recognised text
+    """
+    jobs = [page_numbers[i:i + OCR_PAGES_PER_JOB] for i in range(0, len(page_numbers), OCR_PAGES_PER_JOB)]
+    results = {}
+    # Submit in waves of one job per worker so a long scan can't fill the pool's queue
+    for start in range(0, len(jobs), pool.workers):
+        wave = jobs[start:start + pool.workers]
+        for part in await asyncio.gather(*(
+            pool.run(ocr_pdf_pages, file_path, numbers, OCR_DPI, OCR_LANGUAGE) for numbers in wave
+        )):
+            results.update(part)
+        if on_progress is not None:
+            await on_progress()
+    return results
@@ -0,0 +1,60 @@
+"""
+Page images for document previews.
+
+Pages are rendered with PyMuPDF at one of a few fixed widths, so a viewer can
+request exactly the pages it shows (thumbnails for the sidebar, a larger
+image for the page in view) instead of downloading the whole file.
+Rendering runs in the document process pool; caching is handled by
+app.services.render_cache.
+"""
+import os
+import fitz  # PyMuPDF
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Size name -> image width in pixels
+RENDER_SIZES = {
+    "thumb": 200,
+    "medium": 800,
+    "large": 1600,
+}
+RENDER_JPEG_QUALITY = int(os.getenv("RENDER_JPEG_QUALITY", 80))
+MAX_ASPECT_RATIO = 3  # Very tall pages are clipped to 3x the width in height
+
+
+class PageNotFound(Exception):
+    """The requested page is outside the document"""
+    pass
+
+
+def render_pdf_page(file_path: str, page_number: int, width: int, output_path: str) -> int:
+    """
+    Render one page of a PDF to a JPEG file (runs in a worker process).
+
+    Args:
+        file_path: PDF path
+        page_number: 1-based page number
+        width: Image width in pixels
+        output_path: Where the JPEG is written (atomically)
+
+    Returns:
+        Size of the written image in bytes
+    """
+    with fitz.open(file_path) as doc:
+        if not 1 <= page_number <= doc.page_count:
+            raise PageNotFound(f"Page {page_number} not in document ({doc.page_count} pages)")
+
+        page = doc[page_number - 1]
+        zoom = width / page.rect.width
+        clip = fitz.Rect(page.rect)
+        clip.y1 = min(clip.y1, clip.y0 + page.rect.width * MAX_ASPECT_RATIO)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+        image = pixmap.tobytes("jpg", jpg_quality=RENDER_JPEG_QUALITY)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(image)
+    os.replace(temp_path, output_path)
+    return len(image)
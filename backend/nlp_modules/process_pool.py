@@ -0,0 +1,118 @@
+"""
+Process pool for CPU-bound document work (text extraction, rendering).
+
+PyMuPDF and python-pptx hold the GIL while parsing, so running them in the API
+process, even in a thread, slows every other request down. Jobs submitted here
+run in separate worker processes instead:
+- workers are replaced after EXTRACTION_MAX_TASKS_PER_CHILD jobs to cap memory growth
+- each job has a timeout; a job that overruns it gets the whole pool recycled,
+  since a single busy worker process cannot be cancelled
+- at most EXTRACTION_MAX_QUEUE jobs may be running or waiting; beyond that,
+  submissions fail fast with ExtractionQueueFull
+"""
+import os
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+EXTRACTION_MAX_TASKS_PER_CHILD = int(os.getenv("EXTRACTION_MAX_TASKS_PER_CHILD", 50))
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", 120))
+EXTRACTION_MAX_QUEUE = int(os.getenv("EXTRACTION_MAX_QUEUE", 32))
+
+
+class ExtractionQueueFull(Exception):
+    """Raised when too many jobs are already waiting for the pool"""
+    pass
+
+
+class ExtractionTimeout(Exception):
+    """Raised when a job ran longer than its timeout"""
+    pass
+
+
+class DocumentProcessPool:
+    """
+    Lazily started ProcessPoolExecutor with recycling, timeouts and a bounded queue
+    """
+    def __init__(
+        self,
+        workers: int = EXTRACTION_WORKERS,
+        max_tasks_per_child: int = EXTRACTION_MAX_TASKS_PER_CHILD,
+        max_queue: int = EXTRACTION_MAX_QUEUE,
+    ):
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_queue = max_queue
+        self.pending = 0
+        self._executor = None
+        # Only as many jobs as there are workers are handed to the executor, so the
+        # timeout measures running time rather than time spent waiting for a worker
+        self._running = asyncio.Semaphore(workers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # "spawn" keeps children free of the parent's event loop, sockets and Mongo clients
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.max_tasks_per_child,
+            )
+        return self._executor
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """Throw away the given workers (killing any stuck job) and start fresh on next use"""
+        if self._executor is not executor:
+            return  # Already replaced by a concurrent failure
+        self._executor = None
+        # ProcessPoolExecutor has no public way to stop a running job
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn, *args, timeout: float = EXTRACTION_TIMEOUT_SECONDS):
+        """
+        Run fn(*args) in a worker process.
+
+        Args:
+            fn: Picklable module-level function
+            args: Picklable arguments
+            timeout: Seconds before the job is abandoned and the pool recycled
+
+        Returns:
+            fn's return value
+        """
+        if self.pending >= self.max_queue:
+            raise ExtractionQueueFull(f"{self.pending} extraction jobs already queued")
+
+        self.pending += 1
+        try:
+            async with self._running:
+                executor = self._get_executor()
+                future = asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args))
+                try:
+                    return await asyncio.wait_for(future, timeout=timeout)
+                except asyncio.TimeoutError:
+                    print(f"⏱️ {getattr(fn, '__name__', 'job')} exceeded {timeout:g}s, recycling process pool")
+                    self._recycle(executor)
+                    raise ExtractionTimeout(f"Processing took longer than {timeout:g}s")
+                except BrokenProcessPool:
+                    # A worker died (e.g. crashed on a malformed file); the executor is unusable now
+                    self._recycle(executor)
+                    raise
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Create singleton instance
+document_pool = DocumentProcessPool()
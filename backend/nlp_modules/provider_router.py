@@ -0,0 +1,247 @@
+"""
+Health tracking and circuit breaking for LLM providers.
+
+Each provider keeps a rolling window of recent calls (outcome and latency).
+Repeated failures or a high error rate open the provider's circuit so it is
+skipped for a cool-down period that grows exponentially (with jitter) each
+time it re-opens. 429 responses open the circuit immediately for as long as
+the provider's Retry-After asks. After the cool-down a single probe request
+is let through (half-open): success closes the circuit, failure re-opens it.
+"""
+import os
+import re
+import time
+import random
+from collections import deque
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_HEALTH_WINDOW_SECONDS = int(os.getenv("LLM_HEALTH_WINDOW_SECONDS", 120))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", 3))
+LLM_CIRCUIT_ERROR_RATE = float(os.getenv("LLM_CIRCUIT_ERROR_RATE", 0.5))
+LLM_CIRCUIT_MIN_SAMPLES = int(os.getenv("LLM_CIRCUIT_MIN_SAMPLES", 5))
+LLM_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", 15))
+LLM_CIRCUIT_MAX_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_MAX_COOLDOWN_SECONDS", 300))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    """True if a provider exception represents HTTP 429 / quota exhaustion"""
+    status_code = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if status_code == 429:
+        return True
+    # google.api_core exceptions expose the HTTP status as an int-like `code`
+    return exc.__class__.__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Extract the provider's requested back-off from an exception, if any"""
+    # Groq (httpx based): Retry-After response header
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+
+    # Gemini (gRPC): google.rpc.RetryInfo in the error details
+    for detail in getattr(exc, "details", None) or []:
+        retry_delay = getattr(detail, "retry_delay", None)
+        if retry_delay is not None:
+            return retry_delay.seconds + retry_delay.nanos / 1e9
+
+    # Both providers also spell it out in the message ("Please retry in 23.5s")
+    match = re.search(r"retry in ([\d.]+)\s*s", str(exc), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class ProviderHealth:
+    """
+    Rolling health statistics and circuit breaker state for one provider
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.samples = deque()  # (timestamp, ok, latency); ok is None for cancelled calls
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.last_error = None
+
+    def _prune(self, now: float):
+        cutoff = now - LLM_HEALTH_WINDOW_SECONDS
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def outcomes(self) -> list:
+        """Success flags of completed calls in the window (cancelled calls excluded)"""
+        self._prune(time.monotonic())
+        return [ok for _, ok, _ in self.samples if ok is not None]
+
+    def error_rate(self) -> float:
+        outcomes = self.outcomes()
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        """Latency of successful and cancelled calls at quantile q (0-1), None without data"""
+        self._prune(time.monotonic())
+        latencies = sorted(latency for _, ok, latency in self.samples if ok is not False)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(q * len(latencies)))
+        return latencies[index]
+
+    def seconds_until_available(self) -> float:
+        if self.state == OPEN:
+            return max(0.0, self.open_until - time.monotonic())
+        return 0.0
+
+    def try_acquire(self) -> bool:
+        """Whether a request may be sent now; half-open lets exactly one probe through"""
+        if self.state == OPEN:
+            if time.monotonic() < self.open_until:
+                return False
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+
+        if self.state == HALF_OPEN:
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def release(self):
+        """Give back a half-open probe slot that was never used (e.g. client went away)"""
+        self.probe_in_flight = False
+
+    def record_cancelled(self, latency: float):
+        """
+        A call abandoned after `latency` seconds (e.g. it lost a hedge race).
+        Kept as a latency sample so the tail isn't hidden from the percentiles,
+        but it says nothing about the provider's health, so error_rate skips it.
+        """
+        self.samples.append((time.monotonic(), None, latency))
+        self.probe_in_flight = False
+
+    def record_success(self, latency: float):
+        now = time.monotonic()
+        self.samples.append((now, True, latency))
+        self._prune(now)
+        if self.state != CLOSED:
+            print(f"✅ {self.name} circuit closed")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.probe_in_flight = False
+
+    def record_failure(self, latency: float, exc: Exception):
+        now = time.monotonic()
+        self.samples.append((now, False, latency))
+        self._prune(now)
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        self.last_error = str(exc)[:200]
+
+        if is_rate_limited(exc):
+            self._open(retry_after_seconds(exc))
+        elif self.state == HALF_OPEN:
+            self._open()
+        elif self.consecutive_failures >= LLM_CIRCUIT_FAILURE_THRESHOLD:
+            self._open()
+        elif len(self.outcomes()) >= LLM_CIRCUIT_MIN_SAMPLES and self.error_rate() >= LLM_CIRCUIT_ERROR_RATE:
+            self._open()
+
+    def _open(self, retry_after: Optional[float] = None):
+        # Exponential back-off with jitter so workers don't probe in lockstep
+        backoff = min(
+            LLM_CIRCUIT_MAX_COOLDOWN_SECONDS,
+            LLM_CIRCUIT_COOLDOWN_SECONDS * (2 ** self.times_opened)
+        )
+        cooldown = random.uniform(backoff / 2, backoff)
+        if retry_after is not None:
+            cooldown = retry_after + random.uniform(0, 1)
+
+        self.state = OPEN
+        self.times_opened += 1
+        self.open_until = time.monotonic() + cooldown
+        print(f"🚫 {self.name} circuit open for {cooldown:.1f}s")
+
+    def snapshot(self) -> dict:
+        p50 = self.latency_percentile(0.5)
+        p95 = self.latency_percentile(0.95)
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 4),
+            "samples": len(self.samples),
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(self.seconds_until_available(), 1),
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class ProviderRouter:
+    """
+    Registry of per-provider health used to decide which providers to try
+    """
+    def __init__(self):
+        self._providers = {}
+        self.hedge_stats = {"fired": 0, "won": 0, "lost": 0}
+
+    def health(self, name: str) -> ProviderHealth:
+        if name not in self._providers:
+            self._providers[name] = ProviderHealth(name)
+        return self._providers[name]
+
+    def try_acquire(self, name: str) -> bool:
+        return self.health(name).try_acquire()
+
+    def release(self, name: str):
+        self.health(name).release()
+
+    def record_cancelled(self, name: str, latency: float):
+        self.health(name).record_cancelled(latency)
+
+    def record_success(self, name: str, latency: float):
+        self.health(name).record_success(latency)
+
+    def record_failure(self, name: str, latency: float, exc: Exception):
+        self.health(name).record_failure(latency, exc)
+
+    def record_hedge(self, outcome: str):
+        """Count a hedge being fired, or whether the hedged request won or lost the race"""
+        self.hedge_stats[outcome] += 1
+
+    def seconds_until_available(self, names: list) -> float:
+        """How long until at least one of the given providers accepts requests again"""
+        if not names:
+            return 0.0
+        return min(self.health(name).seconds_until_available() for name in names)
+
+    def get_stats(self) -> dict:
+        return {name: health.snapshot() for name, health in self._providers.items()}
+
+    def get_hedge_stats(self) -> dict:
+        fired = self.hedge_stats["fired"]
+        return {
+            **self.hedge_stats,
+            "win_rate": round(self.hedge_stats["won"] / fired, 4) if fired else 0.0,
+        }
+
+
+# Create singleton instance
+provider_router = ProviderRouter()
@@ -0,0 +1,229 @@
+"""
+In-process scheduler for LLM requests.
+
+Every provider call takes a slot from that provider's limiter first. A limiter
+enforces:
+- a maximum number of concurrent in-flight requests
+- token buckets for requests per minute (RPM) and tokens per minute (TPM)
+- priority classes: interactive requests are always granted before queued
+  background work, and background work cannot use the concurrency and rate
+  headroom reserved for interactive traffic
+Requests that cannot be granted wait in a priority queue; queue wait times
+are recorded per priority class.
+"""
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Share of concurrency and rate quota background work may not touch
+LLM_INTERACTIVE_RESERVED_SLOTS = int(os.getenv("LLM_INTERACTIVE_RESERVED_SLOTS", 1))
+LLM_INTERACTIVE_RATE_RESERVE = float(os.getenv("LLM_INTERACTIVE_RATE_RESERVE", 0.2))
+
+# How long a request may queue for one provider before trying the next one
+LLM_QUEUE_TIMEOUTS = {
+    INTERACTIVE: float(os.getenv("LLM_INTERACTIVE_QUEUE_TIMEOUT_SECONDS", 10)),
+    BACKGROUND: float(os.getenv("LLM_BACKGROUND_QUEUE_TIMEOUT_SECONDS", 300)),
+}
+
+
+class QueueTimeout(Exception):
+    """Raised when a request waited too long for a provider slot"""
+    pass
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding at most one minute of quota.
+    A rate of 0 disables the limit.
+    """
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` (fraction of capacity) untouched"""
+        if self.rate_per_minute <= 0:
+            return 0.0
+        self._refill()
+        # A single request larger than the bucket would never fit; let it through on a full bucket
+        needed = min(amount, self.capacity) + reserve * self.capacity
+        needed = min(needed, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) * 60 / self.rate_per_minute
+
+    def consume(self, amount: float):
+        if self.rate_per_minute <= 0:
+            return
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class ProviderLimiter:
+    """
+    Concurrency, rate and priority control for a single provider
+    """
+    def __init__(self, name: str, max_concurrency: int, rpm: float, tpm: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.in_flight = 0
+        self._waiters = []  # heap of (priority, seq, tokens, future)
+        self._seq = itertools.count()
+        self._timer = None
+        self.stats = {
+            priority: {"granted": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for priority in PRIORITY_NAMES
+        }
+
+    def _slots_for(self, priority: int) -> int:
+        if priority == INTERACTIVE:
+            return self.max_concurrency
+        return max(1, self.max_concurrency - LLM_INTERACTIVE_RESERVED_SLOTS)
+
+    def _rate_wait(self, priority: int, tokens: int) -> float:
+        reserve = LLM_INTERACTIVE_RATE_RESERVE if priority == BACKGROUND else 0.0
+        return max(
+            self.request_bucket.wait_time(1, reserve),
+            self.token_bucket.wait_time(tokens, reserve),
+        )
+
+    def _dispatch(self):
+        """Grant slots to queued requests in priority order while capacity and quota allow"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            priority, _, tokens, future = self._waiters[0]
+            if future.done():
+                # Waiter gave up (timeout or cancellation)
+                heapq.heappop(self._waiters)
+                continue
+
+            if self.in_flight >= self._slots_for(priority):
+                break
+
+            wait = self._rate_wait(priority, tokens)
+            if wait > 0:
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(wait, self._dispatch)
+                break
+
+            heapq.heappop(self._waiters)
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(tokens)
+            self.in_flight += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: int, tokens: int) -> float:
+        """Wait for a slot; returns the time spent queueing"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        enqueued_at = time.monotonic()
+        heapq.heappush(self._waiters, (priority, next(self._seq), tokens, future))
+        self._dispatch()
+
+        try:
+            await asyncio.wait({future}, timeout=LLM_QUEUE_TIMEOUTS[priority])
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+
+        if not future.done():
+            future.cancel()
+            self.stats[priority]["timeouts"] += 1
+            self._dispatch()
+            raise QueueTimeout(
+                f"{self.name} queue wait exceeded {LLM_QUEUE_TIMEOUTS[priority]:.0f}s "
+                f"({PRIORITY_NAMES[priority]})"
+            )
+
+        waited = time.monotonic() - enqueued_at
+        stats = self.stats[priority]
+        stats["granted"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+        return waited
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def snapshot(self) -> dict:
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                queued[PRIORITY_NAMES[priority]] += 1
+
+        wait_stats = {}
+        for priority, stats in self.stats.items():
+            granted = stats["granted"]
+            wait_stats[PRIORITY_NAMES[priority]] = {
+                "granted": granted,
+                "timeouts": stats["timeouts"],
+                "avg_wait_seconds": round(stats["wait_total"] / granted, 3) if granted else 0.0,
+                "max_wait_seconds": round(stats["wait_max"], 3),
+            }
+
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queued": queued,
+            "wait": wait_stats,
+        }
+
+
+class LLMScheduler:
+    """
+    Per-provider limiters behind a single slot() context manager
+    """
+    def __init__(self):
+        self._limiters = {}
+
+    def configure(self, name: str, max_concurrency: int, rpm: float = 0, tpm: float = 0):
+        self._limiters[name] = ProviderLimiter(name, max_concurrency, rpm, tpm)
+
+    def limiter(self, name: str) -> ProviderLimiter:
+        if name not in self._limiters:
+            self.configure(name, max_concurrency=8)
+        return self._limiters[name]
+
+    @asynccontextmanager
+    async def slot(self, name: str, priority: int = INTERACTIVE, tokens: int = 0):
+        """Hold one request slot for provider `name` for the duration of the block"""
+        limiter = self.limiter(name)
+        waited = await limiter.acquire(priority, tokens)
+        if waited > 1:
+            print(f"⏳ Waited {waited:.1f}s for a {name} slot ({PRIORITY_NAMES[priority]})")
+        try:
+            yield waited
+        finally:
+            limiter.release()
+
+    def get_stats(self) -> dict:
+        return {name: limiter.snapshot() for name, limiter in self._limiters.items()}
+
+
+# Create singleton instance
+llm_scheduler = LLMScheduler()
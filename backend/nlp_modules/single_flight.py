@@ -0,0 +1,164 @@
+"""
+Single-flight coalescing of identical in-flight LLM requests.
+
+Concurrent callers with the same request fingerprint share one underlying
+provider call. Within a process this is a shared asyncio task. With a lease
+collection configured (LLM_SINGLE_FLIGHT_MODE=mongo), workers also coordinate
+through a lease document per fingerprint: the worker holding the lease makes
+the call and writes the result into the lease, the others poll for it.
+"""
+import os
+import uuid
+import hashlib
+import asyncio
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_SINGLE_FLIGHT_MODE = os.getenv("LLM_SINGLE_FLIGHT_MODE", "local")  # "local" or "mongo"
+LLM_LEASE_SECONDS = int(os.getenv("LLM_LEASE_SECONDS", 60))
+LLM_LEASE_RESULT_SECONDS = 60  # How long a finished result stays readable by other workers
+LLM_LEASE_POLL_SECONDS = 0.5
+
+
+def make_request_fingerprint(prompt: str, max_tokens: int, temperature: float, template_version: str) -> str:
+    """Provider-independent identity of a generation request"""
+    payload = f"{template_version}\x00{max_tokens}\x00{round(float(temperature), 3)}\x00{prompt}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a fingerprint
+    """
+    def __init__(self):
+        self._flights = {}
+        self.lease_collection = None
+        self.worker_id = uuid.uuid4().hex
+        self.stats = {"leaders": 0, "coalesced": 0, "remote_results": 0}
+
+    def configure_leases(self, collection):
+        """Enable cross-worker coalescing backed by a Mongo collection"""
+        self.lease_collection = collection
+
+    async def run(self, fingerprint: str, make_coro):
+        """
+        Run make_coro() once per fingerprint across all concurrent callers.
+
+        Args:
+            fingerprint: Request identity
+            make_coro: Zero-argument callable returning the coroutine doing the real work
+
+        Returns:
+            The shared result
+        """
+        flight = self._flights.get(fingerprint)
+        if flight is None:
+            self.stats["leaders"] += 1
+            flight = _Flight(asyncio.create_task(self._run_with_lease(fingerprint, make_coro)))
+            self._flights[fingerprint] = flight
+            flight.task.add_done_callback(lambda _: self._forget(fingerprint, flight))
+        else:
+            self.stats["coalesced"] += 1
+            print("🔗 Joining identical in-flight LLM request")
+
+        flight.waiters += 1
+        try:
+            # Shielded so one caller going away doesn't cancel the call for the others
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, fingerprint: str, flight: _Flight):
+        if self._flights.get(fingerprint) is flight:
+            del self._flights[fingerprint]
+
+    async def _run_with_lease(self, fingerprint: str, make_coro):
+        if self.lease_collection is None or LLM_SINGLE_FLIGHT_MODE != "mongo":
+            return await make_coro()
+
+        while True:
+            if await self._try_acquire_lease(fingerprint):
+                return await self._run_as_lease_holder(fingerprint, make_coro)
+
+            lease = await self.lease_collection.find_one({"_id": fingerprint})
+            if lease and lease.get("status") == "done" and lease["expires_at"] > datetime.utcnow():
+                self.stats["remote_results"] += 1
+                return lease["result"]
+            await asyncio.sleep(LLM_LEASE_POLL_SECONDS)
+
+    async def _try_acquire_lease(self, fingerprint: str) -> bool:
+        """Create the lease, or take over one that expired; False if another worker holds it"""
+        now = datetime.utcnow()
+        try:
+            await self.lease_collection.update_one(
+                {"_id": fingerprint, "expires_at": {"$lt": now}},
+                {
+                    "$set": {
+                        "owner": self.worker_id,
+                        "status": "running",
+                        "expires_at": now + timedelta(seconds=LLM_LEASE_SECONDS),
+                    },
+                    "$unset": {"result": ""},
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # A live lease exists, so the filter didn't match and the upsert collided with it
+            return False
+
+    async def _run_as_lease_holder(self, fingerprint: str, make_coro):
+        owned = {"_id": fingerprint, "owner": self.worker_id}
+        heartbeat = asyncio.create_task(self._renew_lease(owned))
+        try:
+            result = await make_coro()
+        except BaseException:
+            heartbeat.cancel()
+            await self.lease_collection.delete_one(owned)
+            raise
+        heartbeat.cancel()
+
+        await self.lease_collection.update_one(
+            owned,
+            {
+                "$set": {
+                    "status": "done",
+                    "result": result,
+                    "expires_at": datetime.utcnow() + timedelta(seconds=LLM_LEASE_RESULT_SECONDS),
+                }
+            },
+        )
+        return result
+
+    async def _renew_lease(self, owned: dict):
+        """Keep the lease alive while a slow (e.g. queued) generation is running"""
+        while True:
+            await asyncio.sleep(LLM_LEASE_SECONDS / 3)
+            await self.lease_collection.update_one(
+                owned,
+                {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=LLM_LEASE_SECONDS)}},
+            )
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "in_flight": len(self._flights),
+            "mode": LLM_SINGLE_FLIGHT_MODE if self.lease_collection is not None else "local",
+        }
+
+
+# Create singleton instance
+single_flight = SingleFlight()
@@ -3,7 +3,12 @@ from nlp_modules.preprocessor import tokenize_sentences
 from nlp_modules.api_client import generate_summary_with_api
 import numpy as np
 
-async def generate_summary(text: str, summary_type: str = "extractive", num_sentences: int = 5) -> str:
+async def generate_summary(
+    text: str,
+    summary_type: str = "extractive",
+    num_sentences: int = 5,
+    allow_fallback: bool = True
+) -> str:
     """
     Generate a summary using API (Gemini with Groq fallback)
     
@@ -11,6 +16,7 @@ async def generate_summary(text: str, summary_type: str = "extractive", num_sent
         text: Input text to summarize
         summary_type: 'extractive' or 'abstractive'
         num_sentences: Number of sentences for extractive summary
+        allow_fallback: Use the local TF-IDF summary if the APIs fail (otherwise raise)
     
     Returns:
         Summary text
@@ -23,6 +29,8 @@ async def generate_summary(text: str, summary_type: str = "extractive", num_sent
         summary = await generate_summary_with_api(text, summary_type)
         return summary.strip()
     except Exception as e:
+        if not allow_fallback:
+            raise
         # Fallback to basic TF-IDF if APIs fail
         print(f"⚠️ API summarization failed, using TF-IDF fallback: {str(e)}")
         return generate_extractive_summary_tfidf(text, num_sentences)
@@ -1,63 +1,110 @@
 import fitz  # PyMuPDF
 from docx import Document
 from pptx import Presentation
+from nlp_modules.process_pool import document_pool, DocumentProcessPool, ExtractionQueueFull, ExtractionTimeout
+import asyncio
 import os
+from dotenv import load_dotenv
 
-async def extract_text_from_file(file_path: str, file_extension: str) -> str:
+load_dotenv()
+
+# PDFs with at least this many pages are split across worker processes
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 50))
+
+# DOCX has no fixed pages; its text is split into sections of about this many characters
+DOCX_SECTION_CHARS = 3000
+
+async def extract_pages_from_file(file_path: str, file_extension: str) -> list:
     """
-    Extract text from various file formats
+    Extract text per page (PDF), slide (PPTX) or section (DOCX), in order, in
+    worker processes so parsing never blocks the event loop
     """
-    text = ""
-    
     try:
         if file_extension.lower() == "pdf":
-            text = extract_from_pdf(file_path)
-        elif file_extension.lower() in ["docx", "doc"]:
-            text = extract_from_docx(file_path)
-        elif file_extension.lower() in ["pptx", "ppt"]:
-            text = extract_from_pptx(file_path)
-        else:
-            raise ValueError(f"Unsupported file type: {file_extension}")
-        
-        return text.strip()
+            return await extract_pdf_parallel(file_path)
+        return await document_pool.run(extract_pages, file_path, file_extension)
+    except (ExtractionQueueFull, ExtractionTimeout):
+        # Pool saturation and timeouts are handled by the callers (ingestion postpones the job)
+        raise
     except Exception as e:
         raise Exception(f"Error extracting text: {str(e)}")
 
-def extract_from_pdf(file_path: str) -> str:
-    """Extract text from PDF using PyMuPDF"""
-    text = ""
+async def extract_pdf_parallel(file_path: str, pool: DocumentProcessPool = document_pool) -> list:
+    """
+    Extract per-page text from a PDF, splitting large documents into page ranges
+    that are parsed concurrently (each worker opens the file itself) and joined in order
+    """
+    page_count = await pool.run(count_pdf_pages, file_path)
+    if page_count < PDF_PARALLEL_MIN_PAGES or pool.workers < 2:
+        return await pool.run(extract_pdf_pages, file_path, 0, page_count)
+    
+    step = -(-page_count // pool.workers)  # Ceiling division
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    parts = await asyncio.gather(*(
+        pool.run(extract_pdf_pages, file_path, start, stop) for start, stop in ranges
+    ))
+    return [page for part in parts for page in part]
+
+def count_pdf_pages(file_path: str) -> int:
+    """Number of pages in a PDF"""
     try:
-        doc = fitz.open(file_path)
-        for page in doc:
-            text += page.get_text()
-        doc.close()
+        with fitz.open(file_path) as doc:
+            return doc.page_count
     except Exception as e:
         raise Exception(f"PDF extraction error: {str(e)}")
-    
-    return text
 
-def extract_from_docx(file_path: str) -> str:
-    """Extract text from DOCX files"""
-    text = ""
+def extract_pdf_pages(file_path: str, start: int, stop: int) -> list:
+    """Extract the text of each page in [start, stop) of a PDF"""
+    try:
+        with fitz.open(file_path) as doc:
+            return [doc[i].get_text() for i in range(start, stop)]
+    except Exception as e:
+        raise Exception(f"PDF extraction error: {str(e)}")
+
+def extract_pages(file_path: str, file_extension: str) -> list:
+    """
+    Extract text per page / slide / section from various file formats
+    """
+    if file_extension.lower() == "pdf":
+        return extract_pdf_pages(file_path, 0, count_pdf_pages(file_path))
+    elif file_extension.lower() in ["docx", "doc"]:
+        return extract_docx_sections(file_path)
+    elif file_extension.lower() in ["pptx", "ppt"]:
+        return extract_pptx_slides(file_path)
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+def extract_docx_sections(file_path: str) -> list:
+    """Extract DOCX text as sections of whole paragraphs, about DOCX_SECTION_CHARS long"""
+    sections = []
+    current = []
+    length = 0
     try:
         doc = Document(file_path)
         for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
+            current.append(paragraph.text + "\n")
+            length += len(paragraph.text) + 1
+            if length >= DOCX_SECTION_CHARS:
+                sections.append("".join(current))
+                current = []
+                length = 0
     except Exception as e:
         raise Exception(f"DOCX extraction error: {str(e)}")
     
-    return text
+    if current:
+        sections.append("".join(current))
+    return sections
 
-def extract_from_pptx(file_path: str) -> str:
-    """Extract text from PPTX files"""
-    text = ""
+def extract_pptx_slides(file_path: str) -> list:
+    """Extract the text of each PPTX slide"""
+    slides = []
     try:
         prs = Presentation(file_path)
         for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text += shape.text + "\n"
+            slides.append("".join(
+                shape.text + "\n" for shape in slide.shapes if hasattr(shape, "text")
+            ))
     except Exception as e:
         raise Exception(f"PPTX extraction error: {str(e)}")
     
-    return text
+    return slides
@@ -0,0 +1,86 @@
+"""
+Token budgeting for prompts.
+
+Estimates token counts per provider, trims input text to a token budget at
+sentence boundaries, and sizes max_tokens for completions from the input size.
+Estimates are character based (no tokenizer downloads) and deliberately a
+little pessimistic.
+"""
+import math
+from nlp_modules.preprocessor import tokenize_sentences
+
+# Average characters per token of each provider's tokenizer on English prose
+CHARS_PER_TOKEN = {
+    "gemini": 4.0,
+    "groq": 3.6,  # Llama 3 tokenizer
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5
+
+# Model context windows (input + output tokens)
+CONTEXT_WINDOWS = {
+    "gemini": 1048576,
+    "groq": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Room left for prompt instructions around the document text
+PROMPT_OVERHEAD_TOKENS = 300
+
+
+def _chars_per_token(providers: list = None) -> float:
+    # With several candidate providers, plan for the one whose tokenizer is least efficient
+    ratios = [CHARS_PER_TOKEN.get(name, DEFAULT_CHARS_PER_TOKEN) for name in providers or []]
+    return min(ratios) if ratios else DEFAULT_CHARS_PER_TOKEN
+
+
+def estimate_tokens(text: str, providers: list = None) -> int:
+    """Token estimate for text; with several providers, the largest of their estimates"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / _chars_per_token(providers))
+
+
+def chars_for_tokens(tokens: int, providers: list = None) -> int:
+    """Approximate number of characters that fit in a token count"""
+    return int(tokens * _chars_per_token(providers))
+
+
+def input_budget(requested_tokens: int, max_output_tokens: int, providers: list = None) -> int:
+    """Clamp a requested input budget to what every provider's context window can hold"""
+    windows = [CONTEXT_WINDOWS.get(name, DEFAULT_CONTEXT_WINDOW) for name in providers or []]
+    window = min(windows) if windows else DEFAULT_CONTEXT_WINDOW
+    return max(1, min(requested_tokens, window - max_output_tokens - PROMPT_OVERHEAD_TOKENS))
+
+
+def fit_to_budget(text: str, budget_tokens: int, providers: list = None) -> str:
+    """
+    Trim text to at most budget_tokens, cutting at a sentence boundary.
+
+    Args:
+        text: Input text
+        budget_tokens: Maximum estimated tokens to keep
+        providers: Provider names the prompt may be sent to
+
+    Returns:
+        The longest sentence-aligned prefix that fits (hard-cut if the first sentence alone is too long)
+    """
+    if estimate_tokens(text, providers) <= budget_tokens:
+        return text
+
+    kept = []
+    used = 0
+    for sentence in tokenize_sentences(text):
+        cost = estimate_tokens(sentence, providers) + 1
+        if used + cost > budget_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+
+    if not kept:
+        return text[:chars_for_tokens(budget_tokens, providers)]
+    return ' '.join(kept)
+
+
+def completion_budget(input_tokens: int, ratio: float, floor: int, cap: int) -> int:
+    """max_tokens proportional to the input size, clamped to [floor, cap]"""
+    return max(floor, min(cap, int(input_tokens * ratio)))
@@ -0,0 +1,59 @@
+"""
+Ingestion must hand jobs back, not fail them, when the extraction pool is full.
+
+Run from backend/:
+    python -m pytest tests
+"""
+import asyncio
+import pytest
+from nlp_modules.process_pool import document_pool, ExtractionQueueFull
+from nlp_modules.text_extractor import extract_pages_from_file
+from app.services import ingestion
+from app.services.ingestion import IngestionQueue
+
+
+class FakeDocuments:
+    async def find_one(self, query, projection=None):
+        return {"_id": query["_id"], "content_hash": "0" * 64}
+
+
+@pytest.fixture
+def full_pool(monkeypatch):
+    monkeypatch.setattr(document_pool, "pending", document_pool.max_queue)
+
+
+@pytest.mark.parametrize("file_type", ["pdf", "docx"])
+def test_extraction_queue_full_is_not_wrapped(full_pool, file_type):
+    with pytest.raises(ExtractionQueueFull):
+        asyncio.run(extract_pages_from_file(f"/uploads/lecture.{file_type}", file_type))
+
+
+def test_job_is_postponed_when_pool_is_full(full_pool, monkeypatch):
+    async def no_blob(content_hash):
+        return None
+
+    monkeypatch.setattr(ingestion, "documents_collection", FakeDocuments())
+    monkeypatch.setattr(ingestion.blob_store, "get", no_blob)
+
+    queue = IngestionQueue(workers=0)
+    postponed, failed = [], []
+
+    async def postpone(job):
+        postponed.append(job)
+
+    async def record_failure(job, exc):
+        failed.append((job, exc))
+
+    async def renew_lease(job, **fields):
+        pass
+
+    queue._renew_lease = renew_lease
+    queue._postpone = postpone
+    queue._record_failure = record_failure
+
+    job = queue._new_job("6ad4437c8ae6493ae50612c4", "user1", "/uploads/lecture.pdf", "pdf")
+    job["_id"] = "job1"
+    asyncio.run(queue._handle(job))
+
+    assert postponed == [job]
+    assert failed == []